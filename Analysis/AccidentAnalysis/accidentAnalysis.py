@@ -1,52 +1,119 @@
+import csv
+import io
+import os
+import pickle
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
 import pandas as pd
+import numpy as np
 import json
-from collections import defaultdict
 
-def process_accidents_data(file_path, output_json_path):
-   
-    chunk_size = 100000
-    accident_grid = defaultdict(lambda: {
-        'lat': 0.0,
-        'lng': 0.0,
-        'count': 0,
-        'injuries': 0,
-        'deaths': 0,
-        'factors': defaultdict(int)
-    })
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))    # Analysis/
+from hotspot_tiles import write_tiles
 
-    total_rows = 0
-    valid_coordinates = 0
+INJURED = 'NUMBER OF PERSONS INJURED'
+KILLED = 'NUMBER OF PERSONS KILLED'
+FACTOR = 'CONTRIBUTING FACTOR VEHICLE 1'
 
-    for chunk in pd.read_csv(file_path, chunksize=chunk_size, dtype={'ZIP CODE': str}):
-        print(f"Processing chunk... (rows processed so far: {total_rows})")
 
-        valid_chunk = chunk.dropna(subset=['LATITUDE', 'LONGITUDE'])
-        valid_coordinates += len(valid_chunk)
+def grid_keys(values, precision=3):
+    """
+    Integer cell of every coordinate: round(value, precision) * 10**precision.
 
-        for _, row in valid_chunk.iterrows():
-            try:
-                lat = round(float(row['LATITUDE']), 3)
-                lng = round(float(row['LONGITUDE']), 3)
-                key = f"{lat},{lng}"
+    np.rint(value * 1000) can fall on the other side of a .5 tie than python's round()
+    (the product is not exact), so the few values close to a tie are rounded with round().
+    """
+    scale = 10 ** precision
+    scaled = values * scale
+    keys = np.rint(scaled)
+    near_tie = np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6
+    if near_tie.any():
+        keys[near_tie] = [round(round(float(value), precision) * scale) for value in values[near_tie]]
+    return keys.astype(np.int64)
 
-                if accident_grid[key]['count'] == 0:
-                    accident_grid[key]['lat'] = lat
-                    accident_grid[key]['lng'] = lng
 
-                accident_grid[key]['count'] += 1
-                accident_grid[key]['injuries'] += int(row.get('NUMBER OF PERSONS INJURED', 0) or 0)
-                accident_grid[key]['deaths'] += int(row.get('NUMBER OF PERSONS KILLED', 0) or 0)
+def count_column(chunk, column):
+    """(values, usable) of a count column. Missing column -> zeros; NaN is not usable (int() fails on it)."""
+    if column not in chunk:
+        return np.zeros(len(chunk), dtype=np.int64), np.ones(len(chunk), dtype=bool)
+    values = pd.to_numeric(chunk[column], errors='coerce').to_numpy(dtype=float)
+    usable = ~np.isnan(values)
+    return np.trunc(np.where(usable, values, 0)).astype(np.int64), usable
 
-                factor = row.get('CONTRIBUTING FACTOR VEHICLE 1')
-                if isinstance(factor, str) and factor.lower() != 'unspecified':
-                    accident_grid[key]['factors'][factor] += 1
-            except ValueError:
-                continue  # Skip any malformed rows
 
-        total_rows += len(chunk)
+def aggregate_chunk(chunk):
+    """
+    Totals of one chunk of rows with coordinates, in order of first appearance:
+        cells   -> (lat, lng) index, count / injuries / deaths
+        factors -> (lat, lng, factor) index, number of rows
+
+    Same rules as the row by row loop it replaces: every row counts, its injuries are
+    added when they are a number, its deaths and factor only when both counts are numbers
+    (the loop stopped at the first count int() failed on).
+    """
+    lat = pd.to_numeric(chunk['LATITUDE'], errors='coerce').to_numpy(dtype=float)
+    lng = pd.to_numeric(chunk['LONGITUDE'], errors='coerce').to_numpy(dtype=float)
+    parsed = ~(np.isnan(lat) | np.isnan(lng))       # malformed coordinates are skipped
+
+    injuries, injuries_ok = count_column(chunk, INJURED)
+    deaths, deaths_ok = count_column(chunk, KILLED)
+    complete = injuries_ok & deaths_ok
+
+    factor = chunk[FACTOR] if FACTOR in chunk else pd.Series(np.nan, index=chunk.index)
+    factor = factor.to_numpy(dtype=object)
+    is_str = np.array([isinstance(value, str) for value in factor], dtype=bool)
+    counted_factor = complete & is_str
+    counted_factor[counted_factor] = pd.Series(factor[counted_factor], dtype=object).str.lower().to_numpy() != 'unspecified'
+
+    rows = pd.DataFrame({
+        'lat': grid_keys(lat[parsed]),
+        'lng': grid_keys(lng[parsed]),
+        'injuries': np.where(injuries_ok, injuries, 0)[parsed],
+        'deaths': np.where(complete, deaths, 0)[parsed],
+        'factor': factor[parsed],
+    })
+    cells = rows.groupby(['lat', 'lng'], sort=False).agg(
+        count=('injuries', 'size'),
+        injuries=('injuries', 'sum'),
+        deaths=('deaths', 'sum'),
+    )
+    factors = rows[counted_factor[parsed]].groupby(['lat', 'lng', 'factor'], sort=False).size()
+    return cells, factors
+
+
+def fold_chunk(accident_grid, chunk):
+    """Adds one chunk of rows with coordinates to the grid, new cells go to the end."""
+    cells, factors = aggregate_chunk(chunk)
+    for key, count, injuries, deaths in zip(cells.index, cells['count'].tolist(), cells['injuries'].tolist(), cells['deaths'].tolist()):
+        cell = accident_grid.get(key)
+        if cell is None:
+            cell = accident_grid[key] = {'count': 0, 'injuries': 0, 'deaths': 0, 'factors': {}}
+        cell['count'] += count
+        cell['injuries'] += injuries
+        cell['deaths'] += deaths
+    for (lat, lng, factor), count in zip(factors.index, factors.tolist()):
+        cell_factors = accident_grid[(lat, lng)]['factors']
+        cell_factors[factor] = cell_factors.get(factor, 0) + count
 
+
+def merge_grids(accident_grid, other):
+    """Folds a grid built from later rows into `accident_grid`, same result as one pass over both."""
+    for key, data in other.items():
+        cell = accident_grid.get(key)
+        if cell is None:
+            accident_grid[key] = data
+            continue
+        cell['count'] += data['count']
+        cell['injuries'] += data['injuries']
+        cell['deaths'] += data['deaths']
+        for factor, count in data['factors'].items():
+            cell['factors'][factor] = cell['factors'].get(factor, 0) + count
+
+
+def build_result(accident_grid, total_rows, valid_coordinates):
     heatmap_data = []
-    for key, data in accident_grid.items():
+    for (lat, lng), data in accident_grid.items():
         top_factors = sorted(
             [{'factor': k, 'count': v} for k, v in data['factors'].items()],
             key=lambda x: x['count'],
@@ -54,8 +121,8 @@ def process_accidents_data(file_path, output_json_path):
         )[:3]
 
         heatmap_data.append({
-            'lat': data['lat'],
-            'lng': data['lng'],
+            'lat': lat / 1000,      # == round(latitude, 3)
+            'lng': lng / 1000,
             'count': data['count'],
             'injuries': data['injuries'],
             'deaths': data['deaths'],
@@ -64,7 +131,7 @@ def process_accidents_data(file_path, output_json_path):
 
     heatmap_data.sort(key=lambda x: (x['deaths'] * 10) + x['injuries'] + (x['count'] * 0.1), reverse=True)
 
-    result = {
+    return {
         'heatmapData': heatmap_data,
         'totalRecords': total_rows,
         'validCoordinates': valid_coordinates,
@@ -74,18 +141,190 @@ def process_accidents_data(file_path, output_json_path):
         }
     }
 
+
+def write_result(result, output_json_path):
     with open(output_json_path, 'w') as f:
-        json.dump(result, f, indent=4)
+        f.write(json.dumps(result, indent=4))     # same text as json.dump, one write instead of one per token
 
-    print(f"Analysis complete. Processed {total_rows} total records.")
-    print(f"Found {valid_coordinates} records with valid coordinates.")
-    print(f"Identified {len(heatmap_data)} unique hotspots.")
+    print(f"Analysis complete. Processed {result['totalRecords']} total records.")
+    print(f"Found {result['validCoordinates']} records with valid coordinates.")
+    print(f"Identified {result['metadata']['totalHotspots']} unique hotspots.")
     print(f"Results saved to {output_json_path}")
 
+
+def process_accidents_data(file_path, output_json_path):
+
+    chunk_size = 100000
+    # (lat key, lng key) -> totals, in order of first appearance like the old per row dict
+    accident_grid = {}
+
+    total_rows = 0
+    valid_coordinates = 0
+
+    for chunk in pd.read_csv(file_path, chunksize=chunk_size, dtype={'ZIP CODE': str}):
+        print(f"Processing chunk... (rows processed so far: {total_rows})")
+
+        valid_chunk = chunk.dropna(subset=['LATITUDE', 'LONGITUDE'])
+        valid_coordinates += len(valid_chunk)
+
+        # one groupby per chunk, only the (much fewer) cells are merged in python
+        fold_chunk(accident_grid, valid_chunk)
+
+        total_rows += len(chunk)
+
+    result = build_result(accident_grid, total_rows, valid_coordinates)
+    write_result(result, output_json_path)
+    return result
+
+
+# ---------------------------------------------------------------------------------------
+# Incremental / parallel rebuild
+#
+# The collisions export only ever gets rows appended. The grid totals are kept in a state
+# file next to the output JSON, together with a watermark: the byte offset in the CSV up
+# to which rows are already counted. An update only parses the bytes after the watermark.
+# Without (usable) state the whole file is split into newline aligned byte ranges which a
+# process pool aggregates; the partial grids are merged in file order, so the result is
+# the same as one sequential pass.
+#
+# Byte ranges are split on newlines, so quoted fields must not contain line breaks
+# (true for the NYC collisions export).
+
+BLOCK_SIZE = 64 * 2**20
+
+
+def state_path_for(output_json_path):
+    return os.path.splitext(output_json_path)[0] + ".state.pkl"
+
+
+def read_header(file_path):
+    """(column names, byte offset where the data rows start)"""
+    with open(file_path, 'rb') as f:
+        header = f.readline()
+    return next(csv.reader([header.decode('utf-8-sig')])), len(header)
+
+
+def complete_end(file_path):
+    """Offset just past the last newline, so a row still being written is left for the next update."""
+    with open(file_path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        end = f.tell()
+        while end > 0:
+            f.seek(max(0, end - BLOCK_SIZE))
+            block = f.read(end - f.tell())
+            newline = block.rfind(b"\n")
+            if newline >= 0:
+                return end - len(block) + newline + 1
+            end -= len(block)
+    return 0
+
+
+def split_ranges(file_path, start, end, parts):
+    """[start, end) cut into `parts` byte ranges that each begin at the start of a row."""
+    cuts = [start]
+    with open(file_path, 'rb') as f:
+        for i in range(1, parts):
+            f.seek(start + (end - start) * i // parts)
+            f.readline()        # move to the next row boundary
+            cuts.append(min(max(f.tell(), cuts[-1]), end))
+    cuts.append(end)
+    return [(lo, hi) for lo, hi in zip(cuts, cuts[1:]) if hi > lo]
+
+
+def iter_blocks(file_path, start, end):
+    """The bytes of [start, end) in blocks of whole rows."""
+    with open(file_path, 'rb') as f:
+        f.seek(start)
+        while start < end:
+            block = f.read(min(BLOCK_SIZE, end - start))
+            if start + len(block) < end:
+                cut = block.rfind(b"\n") + 1
+                if cut > 0:
+                    block = block[:cut]
+                else:       # a row longer than BLOCK_SIZE
+                    block += f.readline()
+                f.seek(start + len(block))
+            start += len(block)
+            yield block
+
+
+def aggregate_range(file_path, columns, start, end):
+    """(grid, rows, rows with coordinates) of the rows in [start, end) - run in the worker processes."""
+    accident_grid = {}
+    total_rows = 0
+    valid_coordinates = 0
+    for block in iter_blocks(file_path, start, end):
+        chunk = pd.read_csv(io.BytesIO(block), header=None, names=columns, dtype={'ZIP CODE': str})
+        valid_chunk = chunk.dropna(subset=['LATITUDE', 'LONGITUDE'])
+        fold_chunk(accident_grid, valid_chunk)
+        total_rows += len(chunk)
+        valid_coordinates += len(valid_chunk)
+    return accident_grid, total_rows, valid_coordinates
+
+
+def load_state(state_path, file_path, columns):
+    """Saved state if it still describes a prefix of file_path, else None."""
+    if not os.path.exists(state_path):
+        return None
+    with open(state_path, 'rb') as f:
+        state = pickle.load(f)
+    if state['columns'] != columns or state['watermark'] > os.path.getsize(file_path):
+        return None         # other file, or rewritten / truncated -> full rebuild
+    return state
+
+
+def save_state(state, state_path):
+    tmp_path = state_path + ".tmp"
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, state_path)        # never leave a half written state behind
+
+
+def update_hotspots(file_path, output_json_path, state_path=None, workers=None, full=False, tiles_dir=None):
+    """
+    Brings output_json_path (and the tile pyramid in tiles_dir, if given) up to date with file_path.
+
+    Only rows appended since the last run are read, unless there is no usable state
+    (or full=True); then the whole file is aggregated by `workers` processes.
+    """
+    state_path = state_path or state_path_for(output_json_path)
+    columns, data_start = read_header(file_path)
+    end = complete_end(file_path)
+    state = None if full else load_state(state_path, file_path, columns)
+
+    if state is None:
+        workers = workers or os.cpu_count() or 1
+        ranges = split_ranges(file_path, data_start, max(end, data_start), workers)
+        print(f"Full build over {len(ranges)} parts...")
+        state = {'columns': columns, 'watermark': data_start, 'grid': {}, 'total_rows': 0, 'valid_coordinates': 0}
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            # map keeps the parts in file order, so cells / factors keep their first seen order
+            partials = pool.map(aggregate_range, [file_path] * len(ranges), [columns] * len(ranges), *zip(*ranges)) if ranges else []
+            for accident_grid, total_rows, valid_coordinates in partials:
+                merge_grids(state['grid'], accident_grid)
+                state['total_rows'] += total_rows
+                state['valid_coordinates'] += valid_coordinates
+    elif end > state['watermark']:
+        print(f"Folding in {end - state['watermark']} new bytes...")
+        accident_grid, total_rows, valid_coordinates = aggregate_range(file_path, columns, state['watermark'], end)
+        merge_grids(state['grid'], accident_grid)
+        state['total_rows'] += total_rows
+        state['valid_coordinates'] += valid_coordinates
+    else:
+        print("No new rows.")
+
+    state['watermark'] = max(end, state['watermark'])
+    result = build_result(state['grid'], state['total_rows'], state['valid_coordinates'])
+    write_result(result, output_json_path)
+    if tiles_dir:
+        tiles = write_tiles(state['grid'], tiles_dir)
+        print(f"Hotspot tiles per precision: {tiles} -> {tiles_dir}")
+    save_state(state, state_path)
     return result
 
+
 def get_top_accident_locations(result_data, top_n=10):
-    
+
     for i, spot in enumerate(result_data['heatmapData'][:top_n]):
         print(f"\n{i+1}. Location: ({spot['lat']}, {spot['lng']})")
         print(f"   Total accidents: {spot['count']}")
@@ -96,7 +335,11 @@ def get_top_accident_locations(result_data, top_n=10):
             for factor in spot['topFactors']:
                 print(f"     - {factor['factor']}: {factor['count']} incidents")
 
-csv_file_path = ""  # Update with actual path
-output_path = "" #.json path
-result = process_accidents_data(csv_file_path, output_path)
-get_top_accident_locations(result)
\ No newline at end of file
+
+if __name__ == '__main__':
+    csv_file_path = ""  # Update with actual path
+    output_path = "" #.json path
+    tiles_dir = ""  # served by /hotspots (HOTSPOT_TILES_DIR of the analysis server)
+    # only rows added since the last run are read (full parallel build the first time)
+    result = update_hotspots(csv_file_path, output_path, tiles_dir=tiles_dir)
+    get_top_accident_locations(result)
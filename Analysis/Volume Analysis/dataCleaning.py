@@ -1,57 +1,256 @@
+import csv
+import io
+import itertools
+import json
+import logging
+import os
+import shutil
+import sys
+
 import pandas as pd
 import numpy as np
+import pyarrow.feather as feather
 from tqdm import tqdm
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))    # Analysis/
 import paths
+from schema import VOLUME_SCHEMA, read_dtypes, memory_mb
 
 #----------------------------------------CLEANING DATASET----------------------------------------
+# Streams the volume CSV: every cleaned chunk is written as one Feather part as soon as it is
+# done, so memory stays at about one chunk instead of the whole dataset (several times over).
+#     <output_dir>/part-00000.feather          cleaned rows
+#     <output_dir>/part-00000.hashes.npy       their row hashes (for deduplication on resume)
+#     <output_dir>/checkpoint.json             source file, chunk size, the next part to write and
+#                                              the byte offset of its first row
+# An interrupted run seeks to that offset and picks up at the first part the checkpoint does not list.
+
+file_path = paths.VOLUME_DATA_PATH
+chunksize = 100000
+output_dir = os.path.join(os.path.dirname(os.path.abspath(file_path)), "volume_clean")
 
-file_path = paths.VOLUME_DATA_PATH  
-chunksize = 100000 
-cleaned_data = []
+UNIQUE_COLUMNS = ['WktGeom', 'Date', 'street', 'Latitude', 'Longitude']
 
 
 def clean_chunk(chunk):
-    
+
     chunk = chunk.drop_duplicates()
 
-    
-    chunk['Vol'] = chunk['Vol'].fillna(0)  
-    chunk = chunk.dropna(subset=['Boro', 'street', 'fromSt', 'toSt'])  
 
-   
+    chunk['Vol'] = chunk['Vol'].fillna(0)
+    chunk = chunk.dropna(subset=['Boro', 'street', 'fromSt', 'toSt'])
+
+
     chunk['DateTime'] = pd.to_datetime(
         chunk[['Yr', 'M', 'D', 'HH', 'MM']].rename(columns={
             'Yr': 'year', 'M': 'month', 'D': 'day', 'HH': 'hour', 'MM': 'minute'
         }), errors='coerce'
     )
 
-    
+
     chunk = chunk.dropna(subset=['DateTime'])
+    chunk['Date'] = chunk['DateTime'].dt.date
+
 
-    
     return chunk.reset_index(drop=True)
 
 
-for chunk in tqdm(pd.read_csv(file_path, chunksize=chunksize)):
-    cleaned_data.append(clean_chunk(chunk))
+def read_header(file_path):
+    """(column names, byte offset where the data rows start)"""
+    with open(file_path, 'rb') as f:
+        header = f.readline()
+    return next(csv.reader([header.decode('utf-8-sig')])), len(header)
 
 
-cleaned_df = pd.concat(cleaned_data, ignore_index=True)
-cleaned_df['Date'] = pd.to_datetime(cleaned_df['DateTime']).dt.date
+def iter_chunks(file_path, columns, offset, chunksize):
+    """(chunk, byte offset after it) for every `chunksize` rows from `offset` on."""
+    with open(file_path, 'rb') as f:
+        f.seek(offset)
+        while True:
+            lines = list(itertools.islice(f, chunksize))
+            if not lines:
+                return
+            # repeated strings are read straight into categoricals
+            chunk = pd.read_csv(io.BytesIO(b"".join(lines)), header=None, names=columns, dtype=read_dtypes(VOLUME_SCHEMA))
+            yield chunk, f.tell()
 
 
+def fixed_types(chunk):
+    """
+    Cleaned chunk with the same dtype per column in every chunk: the schema types (the date
+    columns are complete after cleaning), float64 for every other number. Downcasting each
+    chunk on its own would store, and hash, the same row differently in two chunks.
+    """
+    dtypes = {'DateTime': 'datetime64[ns]'}
+    for column in chunk.columns:
+        if column in VOLUME_SCHEMA:
+            dtypes[column] = VOLUME_SCHEMA[column]
+        elif pd.api.types.is_numeric_dtype(chunk[column].dtype) and not pd.api.types.is_bool_dtype(chunk[column].dtype):
+            dtypes[column] = 'float64'
+    return chunk.astype({column: dtype for column, dtype in dtypes.items() if column in chunk.columns})
+
+
+def row_hashes(df):
+    """64 bit hash per row, by value (categoricals with different categories hash alike)."""
+    return pd.util.hash_pandas_object(df, index=False).to_numpy()
+
+
+class SeenHashes:
+    """
+    Row hashes seen so far, as sorted uint64 runs (8 bytes per row). New runs are merged
+    into the previous one while that is at most twice as large, so there are only about
+    log2(rows / chunk) runs to search and each hash is copied O(log rows) times in total.
+    """
+
+    def __init__(self):
+        self.runs = []
+
+    def __len__(self):
+        return sum(len(run) for run in self.runs)
+
+    @property
+    def nbytes(self):
+        return sum(run.nbytes for run in self.runs)
+
+    def contains(self, hashes):
+        found = np.zeros(len(hashes), dtype=bool)
+        for run in self.runs:
+            pos = np.minimum(np.searchsorted(run, hashes), len(run) - 1)
+            found |= run[pos] == hashes
+        return found
+
+    def add(self, hashes):
+        """Adds hashes that are not in the set yet."""
+        if len(hashes) == 0:
+            return
+        self.runs.append(np.sort(hashes))
+        while len(self.runs) > 1 and len(self.runs[-2]) <= 2 * len(self.runs[-1]):
+            last = self.runs.pop()
+            self.runs[-1] = np.sort(np.concatenate([self.runs[-1], last]), kind='stable')     # merge of two sorted runs
+
+
+def drop_seen(df, hashes, seen):
+    """Rows of df whose hash is neither in `seen` nor earlier in df; adds their hashes to `seen`."""
+    new = ~pd.Series(hashes).duplicated().to_numpy()
+    new &= ~seen.contains(hashes)
+    seen.add(hashes[new])
+    return df[new].reset_index(drop=True), hashes[new]
 
-#--------------------Fetching unique-------------------
-unique_df = cleaned_df[['WktGeom', 'Date']].drop_duplicates()
 
-# Step 2: Merge back the 'street', 'Latitude', and 'Longitude' columns
-# We use an inner merge to add the first match of 'WktGeom' and 'Date'
-result_df = unique_df.merge(cleaned_df[['WktGeom', 'Date', 'street', 'Latitude', 'Longitude']],
-                            on=['WktGeom', 'Date'],
-                            how='inner').drop_duplicates()
+def part_path(output_dir, part, suffix=".feather"):
+    return os.path.join(output_dir, f"part-{part:05d}{suffix}")
 
 
-result_df.to_csv(f'unique_fields.csv', index=False)
+def checkpoint_path(output_dir):
+    return os.path.join(output_dir, "checkpoint.json")
+
+
+def source_info(file_path, chunksize):
+    stat = os.stat(file_path)
+    return {'source': os.path.abspath(file_path), 'size': stat.st_size, 'mtime': stat.st_mtime, 'chunksize': chunksize}
+
+
+def load_checkpoint(output_dir, info):
+    """Checkpoint of an earlier run over the same file and chunk size, None if there is none."""
+    try:
+        with open(checkpoint_path(output_dir)) as f:
+            checkpoint = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if any(checkpoint.get(key) != value for key, value in info.items()):
+        return None
+    return checkpoint
+
+
+def save_checkpoint(output_dir, checkpoint):
+    tmp_path = checkpoint_path(output_dir) + ".tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp_path, checkpoint_path(output_dir))     # a crash leaves the old or the new checkpoint, never half of one
+
+
+def write_part(output_dir, part, df, hashes):
+    # part first, checkpoint after: a crash in between only means this part is written again
+    for path, write in ((part_path(output_dir, part), lambda p: feather.write_feather(df, p)),
+                        (part_path(output_dir, part, ".hashes.npy"), lambda p: np.save(p, hashes))):
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'wb') as f:
+            write(f)
+        os.replace(tmp_path, path)
+
+
+def clean_volume(file_path, output_dir, chunksize=chunksize, restart=False):
+    """
+    Cleans the volume CSV into Feather parts under output_dir, resuming an interrupted run
+    unless restart=True. Rows already written (same hash) are dropped. Returns the checkpoint.
+    """
+    info = source_info(file_path, chunksize)
+    checkpoint = None if restart else load_checkpoint(output_dir, info)
+    if checkpoint is None:
+        shutil.rmtree(output_dir, ignore_errors=True)       # parts of another file / chunk size
+        os.makedirs(output_dir)
+        checkpoint = dict(info, next_part=0, offset=None, rows_read=0, rows_written=0, done=False)
+        save_checkpoint(output_dir, checkpoint)
+    if checkpoint['done']:
+        print(f"{output_dir} is complete ({checkpoint['rows_written']} rows)")
+        return checkpoint
+
+    # hashes of every row written so far, so duplicates across chunks (and runs) are dropped
+    seen = SeenHashes()
+    for part in range(checkpoint['next_part']):
+        seen.add(np.load(part_path(output_dir, part, ".hashes.npy")))
+    if checkpoint['next_part']:
+        print(f"Resuming at part {checkpoint['next_part']} ({checkpoint['rows_read']} rows done)")
+
+    # the finished chunks are skipped by seeking, they are not read again
+    columns, data_start = read_header(file_path)
+    reader = iter_chunks(file_path, columns, checkpoint['offset'] or data_start, chunksize)
+    for chunk, offset in tqdm(reader, initial=checkpoint['next_part']):
+        rows = len(chunk)
+        cleaned = fixed_types(clean_chunk(chunk))
+        cleaned, hashes = drop_seen(cleaned, row_hashes(cleaned), seen)
+
+        part = checkpoint['next_part']
+        write_part(output_dir, part, cleaned, hashes)
+        checkpoint.update(next_part=part + 1, offset=offset, rows_read=checkpoint['rows_read'] + rows,
+                          rows_written=checkpoint['rows_written'] + len(cleaned))
+        save_checkpoint(output_dir, checkpoint)
+
+    checkpoint['done'] = True
+    save_checkpoint(output_dir, checkpoint)
+    logging.info(f"Cleaned {checkpoint['rows_read']} rows -> {checkpoint['rows_written']} in {checkpoint['next_part']} parts, "
+                 f"{len(seen)} row hashes held ({seen.nbytes / 2**20:.0f} MB)")
+    return checkpoint
+
+
+def read_parts(output_dir, columns=None):
+    """Cleaned parts one at a time (only `columns` read from each)."""
+    with open(checkpoint_path(output_dir)) as f:
+        checkpoint = json.load(f)
+    for part in range(checkpoint['next_part']):
+        yield feather.read_table(part_path(output_dir, part), columns=columns).to_pandas()
+
+
+#--------------------Fetching unique-------------------
+def unique_fields(output_dir, columns=UNIQUE_COLUMNS):
+    """
+    Distinct (WktGeom, Date, street, Latitude, Longitude) rows, in order of first appearance.
+
+    Only these columns are read from the parts, and only one part plus the distinct rows
+    found so far are in memory (same rows the old drop_duplicates + self merge produced).
+    """
+    seen = SeenHashes()
+    unique = []
+    for df in read_parts(output_dir, columns):
+        new, _ = drop_seen(df, row_hashes(df), seen)
+        unique.append(new.astype(object))
+    return pd.concat(unique, ignore_index=True) if unique else pd.DataFrame(columns=columns)
 
 
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    clean_volume(file_path, output_dir, chunksize, restart='--restart' in sys.argv[1:])
 
+    result_df = unique_fields(output_dir)
+    print(f"{len(result_df)} unique rows, {memory_mb(result_df):.0f} MB")
+    result_df.to_csv(f'unique_fields.csv', index=False)
@@ -0,0 +1,87 @@
+#----------------------------------------------------------------------OPEN-METEO ARCHIVE STUB-----------------------------------------------------------------
+# Local stand-in for https://archive-api.open-meteo.com/v1/archive, to run the weather
+# enrichment offline:
+#     python openMeteoStub.py --port 8099 --requests-per-minute 600 --error-rate 0.05
+#     process_file(src, dst, base_url="http://127.0.0.1:8099/v1/archive")
+# Values are deterministic per (lat, lon, day). Requests over the per minute limit get a 429
+# with Retry-After, and --error-rate answers a random share of requests with a 503.
+# GET /stats returns how many requests were served / rejected.
+
+import argparse
+import hashlib
+import random
+import time
+from datetime import date, timedelta
+
+from aiohttp import web
+
+VARIABLES = {
+    "temperature_2m_max": (5.0, 35.0),
+    "temperature_2m_min": (-10.0, 20.0),
+    "precipitation_sum": (0.0, 30.0),
+    "rain_sum": (0.0, 25.0),
+    "snowfall_sum": (0.0, 5.0),
+    "windspeed_10m_max": (5.0, 50.0),
+    "wind_speed_10m_max": (5.0, 50.0),
+    "wind_direction_10m_dominant": (0.0, 360.0),
+}
+
+
+def fake_value(variable, lat, lon, day):
+    low, high = VARIABLES[variable]
+    digest = hashlib.sha1(f"{variable}|{lat:.4f}|{lon:.4f}|{day}".encode()).digest()
+    return round(low + (high - low) * int.from_bytes(digest[:4], "big") / 2**32, 1)
+
+
+def make_app(requests_per_minute=600, error_rate=0.0):
+    stats = {"served": 0, "rate_limited": 0, "errors": 0}
+    window = []         # request times of the last minute
+
+    async def archive(request):
+        now = time.monotonic()
+        window[:] = [t for t in window if now - t < 60]
+        if len(window) >= requests_per_minute:
+            stats["rate_limited"] += 1
+            return web.json_response({"error": True, "reason": "Too many requests"}, status=429,
+                                     headers={"Retry-After": str(round(60 - (now - window[0]), 1))})
+        window.append(now)
+        if random.random() < error_rate:
+            stats["errors"] += 1
+            return web.json_response({"error": True, "reason": "Service unavailable"}, status=503)
+
+        try:
+            lat = float(request.query["latitude"])
+            lon = float(request.query["longitude"])
+            start = date.fromisoformat(request.query["start_date"])
+            end = date.fromisoformat(request.query["end_date"])
+        except (KeyError, ValueError):
+            return web.json_response({"error": True, "reason": "Invalid parameters"}, status=400)
+
+        days = [(start + timedelta(days=i)).isoformat() for i in range((end - start).days + 1)]
+        # daily=a,b or daily=a&daily=b
+        requested = ",".join(request.query.getall("daily", [])).split(",")
+        variables = [name for name in requested if name in VARIABLES]
+        daily = {"time": days}
+        for variable in variables:
+            daily[variable] = [fake_value(variable, lat, lon, day) for day in days]
+
+        stats["served"] += 1
+        # the real API snaps to its ~10 km grid, the stub reports that too
+        return web.json_response({"latitude": round(lat, 1), "longitude": round(lon, 1), "daily": daily})
+
+    async def get_stats(request):
+        return web.json_response(stats)
+
+    app = web.Application()
+    app.router.add_get("/v1/archive", archive)
+    app.router.add_get("/stats", get_stats)
+    return app
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Offline stub of the Open-Meteo archive API")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--requests-per-minute", type=int, default=600)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+    web.run_app(make_app(args.requests_per_minute, args.error_rate), host="127.0.0.1", port=args.port)
@@ -1,12 +1,36 @@
 #----------------------------------------------------------------------WEATHER DATA FETCHING-----------------------------------------------------------------
 
+import asyncio
+import os
+import random
+import sys
+
+import aiohttp
+import numpy as np
 import pandas as pd
 import requests
 import time
 from datetime import datetime
-from concurrent.futures import ThreadPoolExecutor
 from tqdm import tqdm
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))    # Analysis/
+from weather_grid import snap, plan_requests, iter_days, days_between
+from weather_store import WeatherStore, DAILY
+
+ARCHIVE_URL = "https://archive-api.open-meteo.com/v1/archive"
+DAILY_VARIABLES = "temperature_2m_max,temperature_2m_min,precipitation_sum,rain_sum,snowfall_sum,windspeed_10m_max"
+MAX_REQUESTS_PER_MINUTE = 550  # as openmeteo allows only 600 calls/min
+
+# Open-Meteo daily variable -> our column
+COLUMNS = {
+    'temperature_2m_max': 'temp_max',
+    'temperature_2m_min': 'temp_min',
+    'precipitation_sum': 'precipitation',
+    'rain_sum': 'rain',
+    'snowfall_sum': 'snow',
+    'windspeed_10m_max': 'windspeed_max',
+}
+
 def parse_date(date_str):
     """Convert date string to YYYY-MM-DD format, handling multiple possible formats"""
     try:
@@ -25,8 +49,32 @@ def parse_date(date_str):
                 raise ValueError(f"Could not parse date: {date_str}. Expected formats: DD-MM-YYYY, YYYY-MM-DD, or MM-DD-YYYY")
 
 # Cache for weather data to avoid duplicate requests
+# (only touched from the event loop thread in the async pipeline, so no lock is needed)
 weather_cache = {}
 
+
+def parse_daily(data):
+    """Open-Meteo archive response -> our weather columns (first day of the response)."""
+    daily_data = data.get('daily', {})
+
+    # Get the first (and only) element for each weather parameter
+    return {
+        'temp_max': daily_data.get('temperature_2m_max', [None])[0],
+        'temp_min': daily_data.get('temperature_2m_min', [None])[0],
+        'precipitation': daily_data.get('precipitation_sum', [None])[0],
+        'rain': daily_data.get('rain_sum', [None])[0],
+        'snow': daily_data.get('snowfall_sum', [None])[0],
+        'windspeed_max': daily_data.get('windspeed_10m_max', [None])[0]
+    }
+
+
+def parse_daily_range(data):
+    """Multi-day Open-Meteo archive response -> {ISO day: our weather columns}."""
+    return {
+        day: {column: values.get(variable) for variable, column in COLUMNS.items()}
+        for day, values in iter_days(data)
+    }
+
 def fetch_weather_data(lat, lon, date):
     """Fetch weather data for a specific location and date with caching"""
     cache_key = f"{lat}_{lon}_{date}"
@@ -35,13 +83,13 @@ def fetch_weather_data(lat, lon, date):
     if cache_key in weather_cache:
         return weather_cache[cache_key]
 
-    url = "https://archive-api.open-meteo.com/v1/archive"
+    url = ARCHIVE_URL
     params = {
         "latitude": lat,
         "longitude": lon,
         "start_date": date,
         "end_date": date,
-        "daily": "temperature_2m_max,temperature_2m_min,precipitation_sum,rain_sum,snowfall_sum,windspeed_10m_max",
+        "daily": DAILY_VARIABLES,
         "timezone": "America/New_York" 
     }
 
@@ -53,18 +101,7 @@ def fetch_weather_data(lat, lon, date):
             response = requests.get(url, params=params, timeout=10)
 
             if response.status_code == 200:
-                data = response.json()
-                daily_data = data.get('daily', {})
-
-                # Get the first (and only) element for each weather parameter
-                result = {
-                    'temp_max': daily_data.get('temperature_2m_max', [None])[0],
-                    'temp_min': daily_data.get('temperature_2m_min', [None])[0],
-                    'precipitation': daily_data.get('precipitation_sum', [None])[0],
-                    'rain': daily_data.get('rain_sum', [None])[0],
-                    'snow': daily_data.get('snowfall_sum', [None])[0],
-                    'windspeed_max': daily_data.get('windspeed_10m_max', [None])[0]
-                }
+                result = parse_daily(response.json())
 
                 # Cache the result
                 weather_cache[cache_key] = result
@@ -89,82 +126,183 @@ def fetch_weather_data(lat, lon, date):
     # If all attempts failed, return None
     return None
 
-def worker(row_data):
-    """Worker function for parallel processing"""
-    index, row = row_data
-    date = parse_date(row['Date'])
-    weather_data = fetch_weather_data(row['Latitude'], row['Longitude'], date)
+class TokenBucket:
+    """
+    Rate limiter shared by all fetch workers: `rate` requests per second on average,
+    bursts of at most `capacity`. Waiters are served in arrival order.
+    """
+
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+def retry_delay(attempt, backoff=1.0, retry_after=None):
+    """Seconds to wait before retry `attempt` (0 based): Retry-After if the server sent one, else full jitter."""
+    if retry_after is not None:
+        try:
+            return float(retry_after)
+        except ValueError:
+            pass
+    return random.uniform(0, backoff * 2 ** attempt)
+
+
+async def fetch_weather_async(session, limiter, lat, lon, start_date, end_date=None, base_url=ARCHIVE_URL, max_retries=4, backoff=1.0):
+    """
+    Weather of one grid cell for every day from start_date to end_date (one request per
+    attempt, through the shared limiter) -> {ISO day: result}, None if all attempts fail.
+    """
+    params = {
+        "latitude": lat,
+        "longitude": lon,
+        "start_date": start_date,
+        "end_date": end_date or start_date,
+        "daily": DAILY_VARIABLES,
+        "timezone": "America/New_York"
+    }
+
+    for attempt in range(max_retries):
+        retry_after = None
+        await limiter.acquire()
+        try:
+            async with session.get(base_url, params=params) as response:
+                if response.status == 200:
+                    return parse_daily_range(await response.json())
+                if response.status != 429 and response.status < 500:
+                    print(f"Error fetching data: {response.status}")
+                    return None
+                retry_after = response.headers.get("Retry-After")      # Too Many Requests / server error
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            if attempt == max_retries - 1:
+                print(f"Failed after {max_retries} attempts: {str(e)}")
+                return None
+
+        if attempt < max_retries - 1:
+            await asyncio.sleep(retry_delay(attempt, backoff, retry_after))
 
-    if weather_data:
-        result = {'index': index}
-        result.update(weather_data)
-        return result
     return None
 
-def process_file(file_path, output_path, max_workers=10):
-    """Process a file with parallel processing and rate limiting"""
+
+async def fetch_many(ranges, base_url=ARCHIVE_URL, requests_per_minute=MAX_REQUESTS_PER_MINUTE, concurrency=10, progress=None, store=None):
+    """
+    Weather for every (cell lat, cell lon, start, end) request -> {(cell lat, cell lon, ISO day): result}.
+
+    One HTTP session (pooled connections), `concurrency` workers pulling requests, and
+    one token bucket limiting all of them together. Days already in weather_cache or in
+    the WeatherStore `store` are not asked for again, fetched days are written to the store.
+    The store is SQLite (blocking): it is read in one batch before the workers start, and
+    written from a thread, so the event loop keeps serving the other workers meanwhile.
+    """
+    limiter = TokenBucket(requests_per_minute / 60, capacity=concurrency)
+    results = {}
+
+    def cached(lat, lon, days):
+        return all(f"{lat}_{lon}_{day}" in weather_cache for day in days)
+
+    def collect(lat, lon, days):
+        for day in days:
+            results[(lat, lon, day)] = weather_cache.get(f"{lat}_{lon}_{day}")
+        if progress is not None:
+            progress.update(1)
+
+    ranges = [(lat, lon, start, end, days_between(start, end)) for lat, lon, start, end in ranges]
+    missing = [(lat, lon, start, end) for lat, lon, start, end, days in ranges if not cached(lat, lon, days)]
+    if missing and store is not None:
+        stored = await asyncio.to_thread(store.get_ranges, missing)
+        for (lat, lon, day), result in stored.items():
+            weather_cache[f"{lat}_{lon}_{day}"] = result
+
+    to_fetch = []
+    for lat, lon, start, end, days in ranges:
+        if cached(lat, lon, days):
+            collect(lat, lon, days)
+        else:
+            to_fetch.append((lat, lon, start, end, days))
+    pending = iter(to_fetch)
+
+    async def worker(session):
+        for lat, lon, start, end, days in pending:      # shared iterator: each request is taken by exactly one worker
+            if not cached(lat, lon, days):
+                fetched = await fetch_weather_async(session, limiter, lat, lon, start, end, base_url)
+                for day, result in (fetched or {}).items():
+                    weather_cache[f"{lat}_{lon}_{day}"] = result
+                if fetched and store is not None:
+                    rows = [(lat, lon, day, DAILY, result) for day, result in fetched.items()]
+                    await asyncio.to_thread(store.put_many, rows)
+            collect(lat, lon, days)
+
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    timeout = aiohttp.ClientTimeout(total=30)      # multi-day responses are larger
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        await asyncio.gather(*(worker(session) for _ in range(concurrency)))
+    return results
+
+
+def attach_weather(df, cell_lats, cell_lons, days, weather):
+    """
+    df with the weather columns of {(cell lat, cell lon, ISO day): result} (see fetch_many)
+    filled in per row, NaN where there is none. cell_lats / cell_lons / days are per row.
+    """
+    found = {key: result for key, result in weather.items() if result}
+    lookup = pd.DataFrame(list(found.values()), columns=list(COLUMNS.values()))
+    lookup.insert(0, 'cell_lat', [lat for lat, _, _ in found])
+    lookup.insert(1, 'cell_lon', [lon for _, lon, _ in found])
+    lookup.insert(2, 'day', [day for _, _, day in found])
+
+    keys = pd.DataFrame({
+        'cell_lat': np.asarray(cell_lats, dtype=float),
+        'cell_lon': np.asarray(cell_lons, dtype=float),
+        'day': np.asarray(days, dtype=object),
+    })
+    attached = keys.merge(lookup, on=['cell_lat', 'cell_lon', 'day'], how='left', validate='many_to_one')
+    for column in COLUMNS.values():
+        df[column] = attached[column].to_numpy(dtype=float)
+    return df
+
+
+def process_file(file_path, output_path, max_workers=10, base_url=ARCHIVE_URL, requests_per_minute=MAX_REQUESTS_PER_MINUTE, weather_db=None):
+    """
+    Process a file with async fetching and rate limiting (base_url -> eg a local stub, see openMeteoStub.py)
+
+    Fetched days are kept in the weather store at weather_db (default: the one the server
+    reads, see weather_store.py), so a rerun only asks for days it has not seen.
+    """
     print(f"Processing {file_path}...")
 
     
     df = pd.read_csv(file_path)
-    total_rows = len(df)
-
-    row_data = list(df.iterrows())
-
-    pbar = tqdm(total=total_rows, desc="Fetching weather data")
-
-   
-    results = []
-    request_times = []
-    MAX_REQUESTS_PER_MINUTE = 550  # as openmeteo allows only 600 calls/min
-
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        futures = []
-
-        for i, data in enumerate(row_data):
-            
-            now = time.time()
-           
-            request_times = [t for t in request_times if now - t < 60]
-
-           
-            if len(request_times) >= MAX_REQUESTS_PER_MINUTE:
-                time_to_wait = 60 - (now - request_times[0])
-                if time_to_wait > 0:
-                    time.sleep(time_to_wait)
-
-          
-            request_times.append(time.time())
-
-            # Submit the task
-            future = executor.submit(worker, data)
-            futures.append(future)
-
-            # Update progress every 20 rows or at the end
-            if (i + 1) % 20 == 0 or i == total_rows - 1:
-                # Wait for completed futures and update progress
-                done_futures = [f for f in futures if f.done()]
-                for f in done_futures:
-                    result = f.result()
-                    if result:
-                        results.append(result)
-                    futures.remove(f)
-                    pbar.update(1)
-
-        # Wait for remaining futures
-        for future in futures:
-            result = future.result()
-            if result:
-                results.append(result)
-            pbar.update(1)
 
+    # sensors share the ~10 km weather cell they are in, and consecutive days of a cell
+    # are asked for in one request
+    dates = df['Date'].map({date: parse_date(date) for date in df['Date'].unique()})
+    cell_lats = snap(df['Latitude'])
+    cell_lons = snap(df['Longitude'])
+    ranges = plan_requests(cell_lats, cell_lons, dates)
+    print(f"{len(df)} rows -> {len(ranges)} requests")
+
+    pbar = tqdm(total=len(ranges), desc="Fetching weather data")
+    store = WeatherStore(weather_db) if weather_db else WeatherStore()
+    weather = asyncio.run(fetch_many(ranges, base_url, requests_per_minute, max_workers, pbar, store))
     pbar.close()
 
-    # Update the dataframe with results
-    for result in results:
-        index = result.pop('index')
-        for key, value in result.items():
-            df.loc[index, key] = value
+    # one row per (cell, day) that got weather, attached to the rows with one keyed merge
+    started = time.perf_counter()
+    df = attach_weather(df, cell_lats, cell_lons, dates, weather)
+    print(f"Attached weather in {time.perf_counter() - started:.1f}s, frame is {df.memory_usage(deep=True).sum() / 2**20:.0f} MB")
 
     # Save the result
     df.to_csv(output_path, index=False)
@@ -173,6 +311,5 @@ def process_file(file_path, output_path, max_workers=10):
     return df
 
 
-
-process_file("","")
-
+if __name__ == '__main__':
+    process_file("","")
@@ -5,6 +5,8 @@ import time
 import numpy as np
 from datetime import datetime
 
+from weather_grid import snap, plan_requests, iter_days
+
 RATE_LIMIT = 600  # Max API calls per minute
 
 
@@ -56,6 +58,55 @@ def get_daily_weather_data(latitude, longitude, date):
         return None
 
 
+def get_weather_range(latitude, longitude, start_date, end_date):
+    """
+    Same weather summary as get_daily_weather_data(), for every day from start_date to
+    end_date in a single request.
+
+    :return: {date (YYYY-MM-DD): weather summary}, None if the request failed
+    """
+    base_url = "https://archive-api.open-meteo.com/v1/archive"
+
+    params = {
+        "latitude": latitude,
+        "longitude": longitude,
+        "start_date": start_date,
+        "end_date": end_date,
+        "daily": [
+            "temperature_2m_max",
+            "temperature_2m_min",
+            "precipitation_sum",
+            "rain_sum",
+            "wind_speed_10m_max",
+            "wind_direction_10m_dominant",
+        ],
+        "timezone": "America/New_York",
+    }
+
+    try:
+        response = requests.get(base_url, params=params, timeout=30)
+        response.raise_for_status()
+        data = response.json()
+    except requests.RequestException as e:
+        print(f"Error fetching weather data for {start_date} - {end_date}: {e}")
+        return None
+
+    weather = {}
+    for date, daily in iter_days(data):
+        max_temperature, min_temperature = daily['temperature_2m_max'], daily['temperature_2m_min']
+        weather[date] = {
+            "date": date,
+            "max_temperature": max_temperature,
+            "min_temperature": min_temperature,
+            "temperature_range": None if max_temperature is None or min_temperature is None else max_temperature - min_temperature,
+            "total_precipitation": daily['precipitation_sum'],
+            "total_rain": daily['rain_sum'],
+            "max_wind_speed": daily['wind_speed_10m_max'],
+            "dominant_wind_direction": daily['wind_direction_10m_dominant'],
+        }
+    return weather
+
+
 def enrich_dataframe_with_weather(df, max_workers=10):
     """
     Enrich DataFrame with weather data using parallel processing
@@ -73,23 +124,24 @@ def enrich_dataframe_with_weather(df, max_workers=10):
         'max_wind_speed', 'dominant_wind_direction'
     ]
 
-    for col in weather_columns:
-        df[col] = np.nan
-
-    unique_weather_queries = df.groupby(['Latitude', 'Longitude', 'Date']).first().reset_index()
+    # Open-Meteo answers per ~10 km grid cell and takes date ranges, so rows are grouped
+    # into one request per (cell, run of consecutive days) instead of one per (sensor, day)
+    cell_lat = pd.Series(snap(df['Latitude']), index=df.index)
+    cell_lon = pd.Series(snap(df['Longitude']), index=df.index)
+    day = pd.to_datetime(df['Date']).dt.strftime('%Y-%m-%d')
+    weather_requests = plan_requests(cell_lat, cell_lon, day)
 
     # Rate limiting variables
     call_count = 0
     start_time = time.time()
 
-    def fetch_weather_for_row(row):
+    def fetch_weather_for_range(request):
         nonlocal call_count, start_time
 
-        date = row['Date']
-        key = (row['Latitude'], row['Longitude'], date)
+        lat, lon, start, end = request
 
-        if key in weather_cache:
-            return key, weather_cache[key]
+        if request in weather_cache:
+            return request, weather_cache[request]
 
         # Rate limit enforcement
         call_count += 1
@@ -100,33 +152,32 @@ def enrich_dataframe_with_weather(df, max_workers=10):
             start_time = time.time()
             call_count = 0
 
-        weather_data = get_daily_weather_data(row['Latitude'], row['Longitude'], date)
+        weather_data = get_weather_range(lat, lon, start, end)
 
         if weather_data:
-            weather_cache[key] = weather_data
+            weather_cache[request] = weather_data
 
-        return key, weather_data
+        return request, weather_data
 
     # Parallel processing with thread pool
+    # results are collected as one small (cell, day) -> weather table ...
+    records = []
     with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        future_to_key = {
-            executor.submit(fetch_weather_for_row, row):
-            (row['Latitude'], row['Longitude'], row['Date'])
-            for _, row in unique_weather_queries.iterrows()
-        }
+        futures = [executor.submit(fetch_weather_for_range, request) for request in weather_requests]
 
-        for future in as_completed(future_to_key):
-            key, weather_data = future.result()
+        for future in as_completed(futures):
+            (lat, lon, _, _), weather_data = future.result()
 
             if weather_data:
-                mask = (
-                    (df['Latitude'] == key[0]) &
-                    (df['Longitude'] == key[1]) &
-                    (df['Date'] == key[2])
-                )
-
-                for col in weather_columns:
-                    df.loc[mask, col] = weather_data.get(col)
+                for date, daily in weather_data.items():
+                    records.append((lat, lon, date, *(daily.get(col) for col in weather_columns)))
+
+    # ... and joined to the rows once, instead of a full length mask per cell and day
+    lookup = pd.DataFrame(records, columns=['cell_lat', 'cell_lon', 'day', *weather_columns])
+    keys = pd.DataFrame({'cell_lat': cell_lat.to_numpy(), 'cell_lon': cell_lon.to_numpy(), 'day': day.to_numpy()})
+    attached = keys.merge(lookup, on=['cell_lat', 'cell_lon', 'day'], how='left', validate='many_to_one')
+    for col in weather_columns:
+        df[col] = attached[col].to_numpy(dtype=float)
 
     return df
 
@@ -0,0 +1,69 @@
+import os
+import re
+import sys
+import time
+
+from bs4 import BeautifulSoup
+
+from blockage import parse_blockage, BOROUGHS
+
+FIXTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "advisories.html")
+
+
+# Old parser, kept only for comparison: every <h2> walks every <strong> after it
+# (find_all_next), so the work grows with boroughs x closures.
+def legacy_parse_blockage(html):
+    soup = BeautifulSoup(html, "html.parser")
+    rows = 0
+    for borough_tag in soup.find_all("h2"):
+        for strong_tag in borough_tag.find_all_next("strong"):
+            street_name = strong_tag.text.strip()
+            street_match = re.search(r"(.+?) between (.+)", street_name)
+            to_street_raw = street_match.group(2) if street_match else "Unknown"
+            p_tag = strong_tag.find_next_sibling("p")
+            if p_tag:
+                details = p_tag.text.strip()
+                re.search(r"(\d{1,2} (?:am|pm) to \d{1,2} (?:am|pm))", details)
+                re.findall(r"(\d{1,2}/\d{1,2}/\d{2,4})", details)
+                re.search(r"for (.+)", details)
+                rows += len(to_street_raw.split(" and "))
+    return rows
+
+
+def synthetic_page(closures_per_borough):
+    """Advisories page in the layout of fixtures/advisories.html with `closures_per_borough` closures per section."""
+    sections = []
+    for borough in BOROUGHS:
+        sections.append(f"<h2>{borough}</h2>")
+        for i in range(closures_per_borough):
+            sections.append(
+                f'<div class="advisory">\n<strong>Avenue {i} between {i} Street and {i + 1} Street</strong>\n'
+                f"<p>One lane closed 10 pm to 5 am, 4/{i % 28 + 1}/25 to 5/{i % 28 + 1}/25 for roadway repairs</p>\n</div>"
+            )
+    return "<html><body><div id=\"content\">\n" + "\n".join(sections) + "\n</div></body></html>"
+
+
+def timed(fn, html, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(html)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+if __name__ == '__main__':
+    # usage: python bench_blockage.py [page1.html page2.html ...]  (saved copies of the advisories page)
+    # without arguments: the committed fixture and synthetic pages of growing size
+    pages = []
+    for path in sys.argv[1:] or [FIXTURE]:
+        with open(path, encoding="utf-8") as f:
+            pages.append((path, f.read()))
+    if not sys.argv[1:]:
+        pages += [(f"synthetic x{n}", synthetic_page(n)) for n in (10, 50, 200)]
+
+    for name, html in pages:
+        legacy, legacy_rows = timed(legacy_parse_blockage, html)
+        new, df = timed(parse_blockage, html)
+        print(f"{name}: {len(html) / 1e3:.0f} kB, legacy {legacy * 1000:.1f} ms ({legacy_rows} rows), "
+              f"streaming {new * 1000:.1f} ms ({len(df)} rows)")
@@ -1,76 +1,361 @@
+import json
+import logging
+import os
+import threading
+import time
+
+from html.parser import HTMLParser
+
 import requests
-from bs4 import BeautifulSoup
 import pandas as pd
 import re
 
-def scrape_blockage():
-    # Fetch webpage
-    url = "https://www.nyc.gov/html/dot/html/motorist/wkndtraf.shtml"
-    response = requests.get(url)
-    soup = BeautifulSoup(response.text, "html.parser")
+from blockage_index import BlockageIndex
+from refresh_lock import RefreshLock
+
+ADVISORIES_URL = "https://www.nyc.gov/html/dot/html/motorist/wkndtraf.shtml"
+
+# compiled once, used for every closure on the page
+STREET_RE = re.compile(r"(.+?) between (.+)")
+TIME_RE = re.compile(r"(\d{1,2} (?:am|pm) to \d{1,2} (?:am|pm))")
+DATE_RE = re.compile(r"(\d{1,2}/\d{1,2}/\d{2,4})")
+REASON_RE = re.compile(r"for (.+)")
+
+BOROUGHS = ["Brooklyn", "Staten Island", "Manhattan", "Bronx", "Queens", "Manhattan/Queens", "Brooklyn/Queens"]
+
+# elements that never get an end tag
+VOID_TAGS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "param", "source", "track", "wbr"}
+
+
+class AdvisoryParser(HTMLParser):
+    """
+    Single pass tokenizer over the advisories page.
+
+    A <strong> closure heading belongs to the last <h2> borough before it, and its
+    details are the first <p> after it under the same parent element (its next
+    sibling <p>). Every tag is looked at once, so parsing is linear in page size.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.rows = []              # (borough, heading, details)
+        self._stack = []            # (tag, element id) of the open elements
+        self._next_id = 0
+        self._borough = None
+        self._captures = []         # text being collected for open h2 / strong / p elements
+        self._pending = {}          # parent id -> [(borough, heading)] waiting for their sibling <p>
+
+    def handle_starttag(self, tag, attrs):
+        if tag in VOID_TAGS:
+            return
+        parent = self._stack[-1][1] if self._stack else None
+        self._next_id += 1
+        self._stack.append((tag, self._next_id))
+
+        if tag in ("h2", "strong", "p"):
+            capture = {"tag": tag, "id": self._next_id, "parent": parent, "parts": [], "borough": self._borough}
+            if tag == "p":
+                capture["headings"] = self._pending.pop(parent, [])
+            self._captures.append(capture)
+
+    def handle_startendtag(self, tag, attrs):
+        pass        # <br/> etc. carry no text
+
+    def handle_endtag(self, tag):
+        if not any(name == tag for name, _ in self._stack):
+            return      # stray end tag
+        while self._stack:
+            name, element_id = self._stack.pop()
+            self._close(element_id)
+            if name == tag:
+                break
+
+    def handle_data(self, data):
+        for capture in self._captures:
+            capture["parts"].append(data)
+
+    def close(self):
+        super().close()
+        while self._stack:      # unclosed elements end with the document
+            self._close(self._stack.pop()[1])
+
+    def _close(self, element_id):
+        self._pending.pop(element_id, None)     # strongs whose parent closed without a <p>
+        if not self._captures or self._captures[-1]["id"] != element_id:
+            return
+        capture = self._captures.pop()
+        text = "".join(capture["parts"]).strip()
+
+        if capture["tag"] == "h2":
+            self._borough = text
+        elif capture["tag"] == "strong":
+            self._pending.setdefault(capture["parent"], []).append((capture["borough"], text))
+        else:
+            for borough, heading in capture["headings"]:
+                self.rows.append((borough, heading, text))
+
+
+def parse_dates(values):
+    """m/d/yyyy and m/d/yy strings -> datetime64, NaT for anything else ("Unknown")."""
+    values = pd.Series(values, dtype=object)
+    long_year = values.str.match(r"^\d{1,2}/\d{1,2}/\d{4}$", na=False)
+    return pd.to_datetime(values, format="%m/%d/%Y", errors="coerce").where(
+        long_year,
+        pd.to_datetime(values, format="%m/%d/%y", errors="coerce")
+    )
+
+
+def parse_blockage(html):
+    parser = AdvisoryParser()
+    parser.feed(html)
+    parser.close()
 
     # Lists to store extracted data
     boroughs, from_streets, to_streets, from_dates, to_dates, times, reasons = [], [], [], [], [], [], []
 
-    # Finding all boroughs (h2 tags)
-    for borough_tag in soup.find_all("h2"):
-        borough = borough_tag.text.strip()
-
-        # Find next sibling elements containing street details
-        for strong_tag in borough_tag.find_all_next("strong"):
-            street_name = strong_tag.text.strip()
-            
-            # Extract "From Street" and "To Street" using regex
-            street_match = re.search(r"(.+?) between (.+)", street_name)
-            if street_match:
-                from_street, to_street_raw = street_match.groups()
-            else:
-                from_street, to_street_raw = street_name, "Unknown"
-
-            # Split "To Street" if it contains "and"
-            to_streets_list = [s.strip() for s in to_street_raw.split(" and ")]
-
-            # The closure details are in the next paragraph (<p>)
-            p_tag = strong_tag.find_next_sibling("p")
-            if p_tag:
-                details = p_tag.text.strip()
-                
-                # Extracting time, from_date, and to_date using regex
-                time_match = re.search(r"(\d{1,2} (?:am|pm) to \d{1,2} (?:am|pm))", details)
-                date_match = re.findall(r"(\d{1,2}/\d{1,2}/\d{2,4})", details)
-                reason_match = re.search(r"for (.+)", details)
-
-                # Assign extracted values
-                time = time_match.group(1) if time_match else "Unknown"
-                from_date = date_match[0] if len(date_match) > 0 else "Unknown"
-                to_date = date_match[1] if len(date_match) > 1 else from_date  # If no second date, assume same as first
-                reason = reason_match.group(1) if reason_match else "Unknown"
-
-                # Store data for each "To Street" separately
-                for to_street in to_streets_list:
-                    boroughs.append(borough)
-                    from_streets.append(from_street)
-                    to_streets.append(to_street)
-                    from_dates.append(from_date)
-                    to_dates.append(to_date)
-                    times.append(time)
-                    reasons.append(reason)
-
-    # Creating DataFrame
+    for borough, street_name, details in parser.rows:
+        # Extract "From Street" and "To Street" using regex
+        street_match = STREET_RE.search(street_name)
+        if street_match:
+            from_street, to_street_raw = street_match.groups()
+        else:
+            from_street, to_street_raw = street_name, "Unknown"
+
+        # Split "To Street" if it contains "and"
+        to_streets_list = [s.strip() for s in to_street_raw.split(" and ")]
+
+        # Extracting time, from_date, and to_date using regex
+        time_match = TIME_RE.search(details)
+        date_match = DATE_RE.findall(details)
+        reason_match = REASON_RE.search(details)
+
+        # Assign extracted values
+        time = time_match.group(1) if time_match else "Unknown"
+        from_date = date_match[0] if len(date_match) > 0 else "Unknown"
+        to_date = date_match[1] if len(date_match) > 1 else from_date  # If no second date, assume same as first
+        reason = reason_match.group(1) if reason_match else "Unknown"
+
+        # Store data for each "To Street" separately
+        for to_street in to_streets_list:
+            boroughs.append(borough)
+            from_streets.append(from_street)
+            to_streets.append(to_street)
+            from_dates.append(from_date)
+            to_dates.append(to_date)
+            times.append(time)
+            reasons.append(reason)
+
+    # Typed columns straight away, request handlers never re-parse the dates.
+    # From Date stays the scraped string ("4/26/25") the app shows, To Date is compared
+    # against today so it is a datetime (the month of From Date is derived in BlockageIndex)
     df = pd.DataFrame({
-        "Borough": boroughs,
-        "From Street": from_streets,
-        "To Street": to_streets,
-        "From Date": from_dates,
-        "To Date": to_dates,
-        "Time": times,
-        "Reason": reasons
+        "Borough": pd.Categorical(boroughs, categories=BOROUGHS),     # other sections become NaN
+        "From Street": pd.Series(from_streets, dtype=object),
+        "To Street": pd.Series(to_streets, dtype=object),
+        "From Date": pd.Series(from_dates, dtype=object),
+        "To Date": parse_dates(to_dates),
+        "Time": pd.Series(times, dtype=object),
+        "Reason": pd.Series(reasons, dtype=object),
     })
+    return df[df['Borough'].notna()].reset_index(drop=True)
 
-    boro = ["Brooklyn", "Staten Island", "Manhattan", "Bronx", "Queens", "Manhattan/Queens", "Brooklyn/Queens"]
-    clean = df[(df['Borough'].isin(boro)) & df['Borough'].notna() & (df['Borough'] != 'Unknown')]
-    return clean
+def scrape_blockage():
+    # Fetch webpage
+    response = requests.get(ADVISORIES_URL)
+    return parse_blockage(response.text)
+
+
+class BlockageStore:
+    """
+    Parsed road closures, kept in memory and on disk and refreshed on a schedule.
+
+    Refreshes send If-None-Match / If-Modified-Since, so an unchanged page costs a
+    304 and no parsing. get() only waits for the network when there is no data at
+    all; otherwise stale data is served while a background refresh runs.
+
+    Processes sharing cache_dir (gunicorn workers) fetch from only one of them, the holder
+    of the cache's RefreshLock; the others reload the files it saves (checked every
+    poll_interval seconds and on requests).
+
+    fixture_path -> parse this local HTML file instead of fetching nyc.gov (offline testing,
+    fixtures/advisories.html is a saved page in the same layout).
+    """
+
+    def __init__(self, cache_dir, refresh_interval=3600, fixture_path=None, url=ADVISORIES_URL, timeout=10, retry_after=60,
+                 poll_interval=60):
+        self.cache_dir = cache_dir
+        self.refresh_interval = refresh_interval
+        self.retry_after = retry_after      # seconds between attempts after a failed refresh
+        self.poll_interval = poll_interval
+        self.refresh_lock = RefreshLock(os.path.join(cache_dir, "blockages.lock"))
+        self.fixture_path = fixture_path
+        self.url = url
+        self.timeout = timeout
+
+        self.data = None            # parsed DataFrame
+        self.index = None           # BlockageIndex over self.data, rebuilt with it
+        self.version = 0            # bumped whenever the parsed data changes
+        self.etag = None
+        self.last_modified = None
+        self.fetched_at = 0.0       # time.time() of the last successful check
+        self._attempted_at = 0.0
+        self._loaded_mtime = None   # of the pickle last loaded from disk
+
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()   # one refresh at a time
+        self._thread = None
+
+    @property
+    def data_path(self):
+        return os.path.join(self.cache_dir, "blockages.pkl")
+
+    @property
+    def meta_path(self):
+        return os.path.join(self.cache_dir, "blockages.json")
+
+    def load(self):
+        """
+        Loads the last parsed copy from disk, returns False if there is none or it cannot
+        be read (the data in memory, if any, is kept then).
+        """
+        if not (os.path.exists(self.data_path) and os.path.exists(self.meta_path)):
+            return False
+        try:
+            mtime = os.path.getmtime(self.data_path)
+            with open(self.meta_path) as f:
+                meta = json.load(f)
+            data = pd.read_pickle(self.data_path)       # pickle keeps the typed columns
+        except Exception as e:
+            logging.error(f"Reading cached blockages failed: {e}")
+            return False
+        self._set_data(data)
+        self._loaded_mtime = mtime
+        with self._lock:
+            self.etag = meta.get("etag")
+            self.last_modified = meta.get("last_modified")
+            self.fetched_at = meta.get("fetched_at", 0.0)
+        return True
+
+    def _set_data(self, data):
+        index = BlockageIndex(data)     # built before the swap, readers keep using the old one meanwhile
+        with self._lock:
+            self.data = data
+            self.index = index
+            self.version += 1
+
+    def save(self):
+        # written next to the target and renamed over it, so other workers reading the cache
+        # see the old or the new file, never a half written one
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = f"{self.data_path}.{os.getpid()}.tmp"
+        self.data.to_pickle(tmp_path)
+        os.replace(tmp_path, self.data_path)
+        tmp_path = f"{self.meta_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"etag": self.etag, "last_modified": self.last_modified, "fetched_at": self.fetched_at}, f)
+        os.replace(tmp_path, self.meta_path)
+
+    def _fetch(self):
+        """Returns (html, etag, last_modified), html is None when the server answered 304 Not Modified."""
+        if self.fixture_path:
+            with open(self.fixture_path, encoding="utf-8") as f:
+                return f.read(), None, None
+
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+
+        response = requests.get(self.url, headers=headers, timeout=self.timeout)
+        if response.status_code == 304:
+            return None, self.etag, self.last_modified
+        response.raise_for_status()
+        return response.text, response.headers.get("ETag"), response.headers.get("Last-Modified")
+
+    def refresh(self):
+        """Checks the page once, returns True if new data was parsed."""
+        with self._refresh_lock:
+            self._attempted_at = time.time()
+            html, etag, last_modified = self._fetch()
+            changed = html is not None
+            if changed:
+                self._set_data(parse_blockage(html))
+            # validators are only kept once the page they belong to was parsed
+            self.etag, self.last_modified = etag, last_modified
+            self.fetched_at = time.time()
+            if self.data is not None:
+                self.save()
+            return changed
+
+    def refresh_safely(self):
+        try:
+            self.refresh()
+        except Exception as e:      # keep serving the old data
+            logging.error(f"Blockage refresh failed: {e}")
+
+    def is_stale(self):
+        return time.time() - self.fetched_at > self.refresh_interval
+
+    def _can_retry(self):
+        return time.time() - self._attempted_at > self.retry_after
+
+    def refresh_in_background(self):
+        if self._refresh_lock.locked() or not self._can_retry():     # already running / failed just now
+            return
+        threading.Thread(target=self.refresh_safely, name="blockage-refresh", daemon=True).start()
+
+    def reload_if_changed(self):
+        """Loads the cache again if another process saved a newer one."""
+        try:
+            mtime = os.path.getmtime(self.data_path)
+        except OSError:
+            return False
+        return mtime != self._loaded_mtime and self.load()
+
+    def _ensure_fresh(self):
+        if self.data is None:
+            self.load()
+        if not self.refresh_lock.acquire():
+            self.reload_if_changed()        # another process refreshes, only read what it saved
+            return
+        if self.data is None and self._can_retry():
+            self.refresh_safely()       # nothing to serve yet, this first fetch has to be waited for
+        elif self.is_stale():
+            self.refresh_in_background()
+
+    def get(self):
+        """Current blockages DataFrame, never older than one refresh cycle once running."""
+        self._ensure_fresh()
+        if self.data is None:
+            return parse_blockage("")      # empty, with the usual typed columns
+        return self.data
+
+    def search(self, street):
+        """Blockages on streets containing `street` with their stats (see BlockageIndex.search), None if none."""
+        self._ensure_fresh()
+        index = self.index
+        if index is None:
+            return None
+        return index.search(street)
+
+    def _run(self):
+        while True:
+            if self.refresh_lock.acquire():
+                if self.is_stale():
+                    self.refresh_safely()
+                # sleep until the next refresh is due, retry failed ones sooner
+                wait = self.fetched_at + self.refresh_interval - time.time()
+                wait = wait if wait > 0 else self.retry_after
+            else:
+                self.reload_if_changed()
+                wait = self.poll_interval
+            time.sleep(wait)
 
-    # Save to Excel
-    # df.to_excel("nyc_traffic_advisories.xlsx", index=False, engine="openpyxl")
-    print("File saved successfully!")
+    def start(self):
+        """Starts the scheduled refresher once."""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name="blockage-scheduler", daemon=True)
+        self._thread.start()
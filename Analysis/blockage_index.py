@@ -0,0 +1,138 @@
+import re
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+# columns that make one blockage unique (a closure is listed once per "To Street" and time window)
+UNIQUE_COLUMNS = ['Reason', 'From Street', 'To Street', 'From Date', 'To Date']
+
+
+def month_of(dates):
+    """Month of scraped m/d/yy dates ("4/26/25" -> 4), NaN for "Unknown"."""
+    if pd.api.types.is_datetime64_any_dtype(dates):     # caches written when From Date was parsed
+        return dates.dt.month
+    return pd.to_numeric(dates.str.extract(r"^(\d{1,2})/\d{1,2}/\d{2,4}$", expand=False), errors='coerce', downcast='integer')
+
+
+def trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def initialism(name):
+    """"brooklyn-queens expressway" -> "bqe", None for names of fewer than 3 words or with numbers."""
+    words = _TOKEN.findall(name)
+    if len(words) < 3 or not all(word.isalpha() for word in words):
+        return None
+    return "".join(word[0] for word in words)
+
+
+class BlockageIndex:
+    """
+    Substring search over the From / To street names of one parsed blockage frame.
+
+    Built once per refresh of the data. Only the distinct street names are indexed:
+    token and trigram postings -> name ids, name id -> row ids. A query is matched
+    case insensitively as a plain substring of either street (the old
+    str.lower().str.contains filter), the postings only narrow down which names
+    have to be checked. A query can also be the initialism of a name of three or more
+    words ("bqe" -> Brooklyn-Queens Expressway, "lie", "sie").
+
+    Per street stats (total_blockages, com_reason, monthly_blockages) are computed
+    at build time for every indexed name, and cached for other queries.
+    """
+
+    def __init__(self, data, cache_size=256):
+        self.data = data.assign(month=month_of(data['From Date'])).reset_index(drop=True)
+        self.cache_size = cache_size
+
+        codes, names = pd.factorize(pd.concat([self.data['From Street'], self.data['To Street']], ignore_index=True))
+        self.names = [str(name).lower() for name in names]
+        n_rows = len(self.data)
+        from_codes, to_codes = codes[:n_rows], codes[n_rows:]
+
+        # name id -> sorted row ids where it is the From or the To street
+        pairs = np.concatenate([
+            np.stack([from_codes, np.arange(n_rows)], axis=1),
+            np.stack([to_codes, np.arange(n_rows)], axis=1),
+        ])
+        pairs = np.unique(pairs[pairs[:, 0] >= 0], axis=0)        # sorted by name, then row
+        starts = np.flatnonzero(np.diff(pairs[:, 0], prepend=-1))
+        ends = np.append(starts[1:], len(pairs))
+        self.name_rows = {int(pairs[start, 0]): pairs[start:end, 1] for start, end in zip(starts, ends)}
+
+        self.tokens = {}        # token -> set of name ids
+        self.trigrams = {}      # trigram -> set of name ids
+        self.initialisms = {}   # initialism -> set of name ids
+        for name_id, name in enumerate(self.names):
+            short = initialism(name)
+            if short is not None:
+                self.initialisms.setdefault(short, set()).add(name_id)
+            for token in _TOKEN.findall(name):
+                self.tokens.setdefault(token, set()).add(name_id)
+            for gram in trigrams(name):
+                self.trigrams.setdefault(gram, set()).add(name_id)
+
+        # one id per unique blockage, -1 when part of the key is missing (groupby drops those)
+        self._blockage_ids = self.data.groupby(UNIQUE_COLUMNS, sort=False).ngroup().to_numpy()
+
+        self.street_stats = {name: self._stats(self.name_rows[name_id]) for name_id, name in enumerate(self.names)}
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def match_names(self, query):
+        """Ids of the street names containing `query`, or abbreviated by it."""
+        query = query.lower()
+        if len(query) >= 3:
+            postings = [self.trigrams.get(gram, set()) for gram in trigrams(query)]
+            candidates = set.intersection(*sorted(postings, key=len))
+        elif query.isalnum():
+            # a short query without spaces lies inside a single token
+            candidates = set().union(*(ids for token, ids in self.tokens.items() if query in token))
+        else:
+            candidates = range(len(self.names))
+        matches = {name_id for name_id in candidates if query in self.names[name_id]}
+        return sorted(matches | self.initialisms.get(query.strip(), set()))
+
+    def rows(self, query):
+        """Row ids (ascending) of blockages on a street containing `query`."""
+        matches = [self.name_rows[name_id] for name_id in self.match_names(query)]
+        if not matches:
+            return np.empty(0, dtype=np.intp)
+        return np.unique(np.concatenate(matches))
+
+    def _stats(self, rows):
+        blocked = self.data.iloc[rows]
+        blockage_ids = self._blockage_ids[rows]
+        return {
+            "rows": blocked,
+            "total_blockages": int(np.unique(blockage_ids[blockage_ids >= 0]).size),
+            "com_reason": blocked['Reason'].value_counts().head(5).to_dict(),
+            "monthly_blockages": blocked.groupby('month').size(),
+        }
+
+    def search(self, query):
+        """Blockages matching `query` and their stats, None when there are none."""
+        key = query.lower()
+        if key in self.street_stats:
+            stats = self.street_stats[key]
+            # a name can also be part of longer names ("atlantic avenue" / "atlantic avenue extension")
+            if len(self.match_names(key)) == 1:
+                return stats
+
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+
+        rows = self.rows(key)
+        stats = self._stats(rows) if len(rows) else None
+        with self._lock:
+            self._cache[key] = stats
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return stats
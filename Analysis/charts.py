@@ -0,0 +1,196 @@
+import base64
+import io
+import logging
+import queue
+import threading
+from collections import Counter, OrderedDict
+
+import matplotlib
+matplotlib.use('Agg')  # Use a non-GUI backend
+import matplotlib.pyplot as plt
+import matplotlib.colors as mcolors
+import seaborn as sns
+
+
+# pyplot keeps global state (current figure), so only one thread may draw at a time
+render_lock = threading.Lock()
+
+
+def plot_to_base64(**savefig_kwargs):
+    """Saves the current figure as a base64 PNG string and closes it."""
+    img_io = io.BytesIO()
+    # saves image in binary stream .. so as to avoid saving as a file on disk
+    plt.savefig(img_io, format="png", **savefig_kwargs)
+    plt.close()
+    return base64.b64encode(img_io.getvalue()).decode("utf-8")     # json doesnt support binary data
+
+
+def hour_plot(street, hourly_volume):
+    with render_lock:
+        plt.figure(figsize=(12, 6))
+        sns.lineplot(data=hourly_volume, x="HH", y="Vol")
+        plt.xlabel("Hour of the Day")
+        plt.ylabel("Average Traffic Volume")
+        plt.title(f"Traffic Volume for {street}")
+        plt.xticks(rotation=45)
+        return plot_to_base64(bbox_inches="tight")
+
+
+def monthly_blockages_plot(street, monthly_blockages):
+    with render_lock:
+        plt.figure(figsize=(10, 6)) # w x h
+        monthly_blockages.plot(kind='bar')
+        plt.title(f"Monthly Blockage Patterns for {street}")
+        plt.xlabel("Month")
+        plt.ylabel("Number of Blockages")
+        return plot_to_base64(bbox_inches="tight")
+
+
+def accidents_by_hour_plot(hourly_accidents):
+    with render_lock:
+        # find the hour with the most accidents
+        peak_hour = hourly_accidents['Accident_Count'].idxmax()
+        colors = [mcolors.to_rgba('red', 1.0) if hour == peak_hour else mcolors.to_rgba('pink') for hour in hourly_accidents['Hour']]
+
+        plt.figure(figsize=(10, 5))
+        sns.barplot(x=hourly_accidents['Hour'], y=hourly_accidents['Accident_Count'], palette=colors)
+        plt.xlabel("Hour of the Day")
+        plt.ylabel("Number of Accidents")
+        plt.title("Accidents by Hour of the Day")
+        plt.xticks(range(24))
+        plt.grid(axis='y', linestyle='--', alpha=0.7)
+        return plot_to_base64(bbox_inches="tight")
+
+
+def vehicle_types_plot(vehicle_types):
+    with render_lock:
+        plt.figure(figsize=(10, 5))
+        sns.barplot(x=vehicle_types.values, y=vehicle_types.index, palette="coolwarm")
+        plt.xlabel("Number of Accidents")
+        plt.ylabel("Vehicle Type")
+        plt.title("Top 10 Vehicle Types Involved in Accidents")
+        plt.grid(axis='x', linestyle='--', alpha=0.7)
+        return plot_to_base64(bbox_inches="tight")
+
+
+def correlation_plot(merged_data):
+    with render_lock:
+        plt.figure(figsize=(8,6))
+        # Scatter plot with trend line
+        sns.regplot(x=merged_data['Vol'], y=merged_data['accident_count'],
+                    scatter_kws={'s': 10, 'alpha': 0.5},  # Adjust dot size and transparency
+                    line_kws={'color': 'red'},  # Make the trend line red
+                    lowess=False)
+        # A linear regression trend line shows the overall pattern.
+        # If sloped upwards → More traffic leads to more accidents.
+
+        plt.xlabel("Traffic Volume")
+        plt.ylabel("Accident Count")
+        plt.title("Traffic Volume vs Accident Count with Trend Line")
+        return plot_to_base64()
+
+
+def risk_plot(street, hourly_analysis, riskiest_hour):
+    with render_lock:
+        # Plot risk ratio by hour
+        plt.figure(figsize=(12, 6))
+        sns.lineplot(data=hourly_analysis, x='Hour1', y='Risk Ratio')
+        plt.axvline(x=riskiest_hour,
+                    color='red', linestyle='--',
+                    label=f"Riskiest Hour: {riskiest_hour}:00")
+        plt.title(f"Accident Risk by Hour for {street}")
+        plt.xlabel("Hour of Day")
+        plt.ylabel("Accidents per 1000 Vehicles")
+        plt.legend()
+        return plot_to_base64(bbox_inches="tight")
+
+
+class ChartCache:
+    """
+    Size bounded LRU of rendered charts, keyed by (street, chart type, data version).
+
+    A new data version makes old entries unreachable; they age out through LRU eviction.
+    """
+
+    def __init__(self, max_entries=512):
+        self.max_entries = max_entries
+        self._charts = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._charts
+
+    def get(self, key, render):
+        """Cached chart for `key`, calling render() only on a miss."""
+        with self._lock:
+            if key in self._charts:
+                self._charts.move_to_end(key)
+                return self._charts[key]
+
+        chart = render()    # drawn outside the cache lock, render_lock serializes matplotlib
+        self.put(key, chart)
+        return chart
+
+    def put(self, key, chart):
+        with self._lock:
+            self._charts[key] = chart
+            self._charts.move_to_end(key)
+            while len(self._charts) > self.max_entries:
+                self._charts.popitem(last=False)    # least recently used
+
+
+class Prerenderer:
+    """
+    Background worker that renders the charts of popular streets off the request thread.
+
+    render_street(street) should render (and so cache) every chart of one street.
+    Streets queued with warm() are rendered first; after that the most requested
+    streets are re-checked every `interval` seconds, which also re-renders them
+    after a data version change.
+
+    At most `max_streets` hit counts are kept: past that the less requested half is dropped.
+    """
+
+    def __init__(self, render_street, interval=60, top_n=20, max_streets=1000):
+        self.render_street = render_street
+        self.interval = interval
+        self.top_n = top_n
+        self.max_streets = max_streets
+        self.hits = Counter()       # street -> number of requests
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def record_hit(self, street):
+        with self._lock:
+            self.hits[street] += 1
+            if len(self.hits) > self.max_streets:
+                self.hits = Counter(dict(self.hits.most_common(self.max_streets // 2)))
+
+    def most_requested(self):
+        with self._lock:
+            return [street for street, _ in self.hits.most_common(self.top_n)]
+
+    def warm(self, streets):
+        for street in streets:
+            self._queue.put(street)
+
+    def _run(self):
+        while True:
+            try:
+                street = self._queue.get(timeout=self.interval)
+            except queue.Empty:
+                self.warm(self.most_requested())
+                continue
+            try:
+                self.render_street(street)
+            except Exception as e:
+                logging.error(f"Error prerendering charts for {street}: {e}")
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name="chart-prerender", daemon=True)
+        self._thread.start()
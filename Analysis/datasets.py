@@ -0,0 +1,90 @@
+import logging
+import os
+import time
+
+import pandas as pd
+
+try:
+    import pyarrow.feather as feather
+except ImportError:         # no pyarrow -> always load the CSVs
+    feather = None
+
+import schema
+from preprocess import prepare_volume, prepare_accidents
+from paths import VOLUME_DATA_PATH, ACCIDENT_DATA_PATH
+
+
+# The CSVs are converted once (python datasets.py) into an uncompressed Feather file
+# next to them, with every derived column already added and typed (schema.py). The server then
+# memory maps that file instead of parsing the CSV and re-deriving the columns. The file holds
+# one record batch, so every column is one contiguous buffer: numeric columns without missing
+# values are used straight from the mapped pages (shared by all processes through the page
+# cache), only categoricals, strings and nullable columns are converted into pandas memory.
+
+# name -> (csv path, prepare function, schema, columns the server needs)
+DATASETS = {
+    'volume': (VOLUME_DATA_PATH, prepare_volume, schema.VOLUME_SCHEMA, schema.VOLUME_COLUMNS),
+    'collisions': (ACCIDENT_DATA_PATH, prepare_accidents, schema.COLLISION_SCHEMA, schema.COLLISION_COLUMNS),
+}
+
+
+def columnar_path(csv_path):
+    return os.path.splitext(csv_path)[0] + ".feather"
+
+
+def ingest(name):
+    """CSV -> prepared, typed Feather file. Returns the path written."""
+    csv_path, prepare, table_schema, _ = DATASETS[name]
+    start = time.perf_counter()
+    df = prepare(pd.read_csv(csv_path, dtype=schema.read_dtypes(table_schema)))
+    df = schema.apply_schema(df, table_schema, name=name)      # every column, load() picks what it needs
+
+    path = columnar_path(csv_path)
+    # uncompressed and in one chunk so columns can be used from the mapped file without a copy
+    feather.write_feather(df.reset_index(drop=True), path, compression='uncompressed', chunksize=max(len(df), 1))
+    logging.info(f"Ingested {name}: {len(df)} rows -> {path} in {time.perf_counter() - start:.1f}s")
+    return path
+
+
+def load(name, columns=None):
+    """
+    Prepared frame of a dataset, from its Feather file when that is present and
+    newer than the CSV, otherwise parsed and prepared from the CSV.
+
+    columns=True keeps only the columns some endpoint reads (schema.*_COLUMNS),
+    a list keeps those columns, None keeps everything.
+    """
+    csv_path, prepare, table_schema, needed = DATASETS[name]
+    if columns is True:
+        columns = needed
+    path = columnar_path(csv_path)
+    start = time.perf_counter()
+
+    if feather is not None and os.path.exists(path) and (
+            not os.path.exists(csv_path) or os.path.getmtime(path) >= os.path.getmtime(csv_path)):
+        table = feather.read_table(path, memory_map=True)
+        if columns is not None:
+            table = table.select([column for column in table.column_names if column in columns])    # other columns are never read
+        # split_blocks -> one block per column, so single chunk columns stay zero copy views of the map
+        # (read only); self_destruct -> each Arrow column is released once it has been converted
+        df = table.to_pandas(split_blocks=True, self_destruct=True)
+        del table
+        source = path
+    else:
+        if feather is not None:
+            logging.warning(f"No up to date {path}, loading the CSV (run: python datasets.py)")
+        usecols = None if columns is None else (lambda column: column in columns)
+        df = prepare(pd.read_csv(csv_path, usecols=usecols, dtype=schema.read_dtypes(table_schema, columns)))
+        df = schema.apply_schema(df, table_schema, columns, name=name)
+        source = csv_path
+
+    logging.info(f"Loaded {name} from {source} in {time.perf_counter() - start:.1f}s, {schema.memory_mb(df):.0f} MB")
+    return df
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    if feather is None:
+        raise SystemExit("pyarrow is required to write the Feather files (pip install pyarrow)")
+    for name in DATASETS:
+        ingest(name)
@@ -0,0 +1,41 @@
+# Production entry point for the analysis server:
+#     cd Analysis && gunicorn -c gunicorn.conf.py server:app
+#
+# The app (and so the volume / collision frames, the street store and the indexes) is
+# imported once in the master, then the workers are forked from it. The frames are
+# only read after loading, so their pages stay shared between workers copy-on-write
+# instead of every process holding its own copy.
+#
+# ANALYSIS_WORKERS / ANALYSIS_THREADS / ANALYSIS_BIND / ANALYSIS_TIMEOUT tune it.
+import gc
+import multiprocessing
+import os
+
+bind = os.environ.get("ANALYSIS_BIND", "0.0.0.0:5000")
+workers = int(os.environ.get("ANALYSIS_WORKERS", multiprocessing.cpu_count()))
+threads = int(os.environ.get("ANALYSIS_THREADS", 4))       # per worker, charts are drawn one at a time per process
+worker_class = "gthread"
+timeout = int(os.environ.get("ANALYSIS_TIMEOUT", 120))
+preload_app = True      # load the datasets in the master, before forking
+
+
+def on_starting(server):
+    # the app is already loaded (preload_app): build the dashboard and the charts of the busiest
+    # streets once here, so the workers inherit them instead of each building its own
+    from server import warm_caches
+    warm_caches()
+
+
+def pre_fork(server, worker):
+    # move everything loaded so far out of the collector's reach, otherwise a gc pass in a
+    # worker writes to every object header and un-shares the pages
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    # threads dont survive fork, so each worker starts its own refresh / prerender threads.
+    # The blockage scraper and the weather refresher only fetch in the worker holding their
+    # RefreshLock (refresh_lock.py), the others read the files / store it writes. Nothing may
+    # take those locks in the master, every forked worker would inherit them.
+    from server import start_background_jobs
+    start_background_jobs()
@@ -0,0 +1,209 @@
+import json
+import math
+import os
+import threading
+
+import numpy as np
+
+
+METERS_PER_DEGREE = 111320.0
+MAX_RADIUS_M = 1000.0      # larger radii would walk thousands of buckets per segment
+MAX_ROUTE_BUCKETS = 200000  # bucket visits per lookup, about a second of work
+SEGMENT_BLOCK = 256        # route pieces measured at once in near_route
+
+
+class HotspotIndex:
+    """
+    Grid hash over the hotspot cells of the heatmap JSON (heatmapData of
+    AccidentAnalysis/accidentAnalysis.py), for "which hotspots are within r meters of
+    this route" lookups.
+
+    Cells are bucketed by floor(lat / bucket_deg), floor(lng / bucket_deg). A route only
+    visits the buckets along its own segments inside the extent of the cells, so the cost
+    of a lookup depends on the route length there and the local density, not on how many
+    hotspots the city has.
+    """
+
+    def __init__(self, cells, bucket_deg=0.005):
+        self.cells = cells
+        self.bucket_deg = bucket_deg
+        self.lats = np.array([cell['lat'] for cell in cells], dtype=float)
+        self.lngs = np.array([cell['lng'] for cell in cells], dtype=float)
+
+        # (south, north, west, east) of the cells, parts of a route outside it are never walked
+        self.extent = (self.lats.min(), self.lats.max(), self.lngs.min(), self.lngs.max()) if len(cells) else None
+
+        self.buckets = {}       # (i, j) -> array of cell ids
+        keys = np.stack([np.floor(self.lats / bucket_deg), np.floor(self.lngs / bucket_deg)], axis=1).astype(np.int64)
+        if len(cells):
+            order = np.lexsort((keys[:, 1], keys[:, 0]))
+            sorted_keys = keys[order]
+            starts = np.flatnonzero(np.any(np.diff(sorted_keys, axis=0, prepend=sorted_keys[:1] - 1) != 0, axis=1))
+            ends = np.append(starts[1:], len(order))
+            for start, end in zip(starts, ends):
+                self.buckets[tuple(sorted_keys[start])] = order[start:end]
+
+    @classmethod
+    def from_json(cls, path, **kwargs):
+        with open(path) as f:
+            return cls(json.load(f)['heatmapData'], **kwargs)
+
+    def segment_buckets(self, lats, lngs, radius_m):
+        """
+        (boxes, segment ids) to visit for the polyline through (lats, lngs): every segment is
+        clipped to the extent of the cells grown by radius_m and cut into pieces at most one
+        bucket long, and each piece gives the (first, last) bucket rows and columns its box
+        grown by radius_m covers. So a long segment only walks the buckets along it instead
+        of its whole bounding box.
+
+        Raises ValueError when the route would visit more than MAX_ROUTE_BUCKETS buckets.
+        """
+        if not self.cells or len(lats) == 0:
+            return np.empty((0, 4), dtype=np.int64), np.empty(0, dtype=np.int64)
+        dlat = radius_m / METERS_PER_DEGREE
+        dlng = radius_m / (METERS_PER_DEGREE * max(math.cos(math.radians(float(np.mean(lats)))), 1e-6))
+        lat0, lat1 = (lats[:-1], lats[1:]) if len(lats) > 1 else (lats, lats)
+        lng0, lng1 = (lngs[:-1], lngs[1:]) if len(lngs) > 1 else (lngs, lngs)
+
+        # part t0..t1 of each segment inside the grown extent (Liang-Barsky clipping)
+        south, north, west, east = self.extent
+        t0 = np.zeros(len(lat0))
+        t1 = np.ones(len(lat0))
+        for start, delta, lo, hi in ((lat0, lat1 - lat0, south - dlat, north + dlat),
+                                     (lng0, lng1 - lng0, west - dlng, east + dlng)):
+            moving = delta != 0
+            with np.errstate(divide='ignore', invalid='ignore'):
+                ta, tb = (lo - start) / delta, (hi - start) / delta
+            t0 = np.where(moving, np.maximum(t0, np.minimum(ta, tb)), t0)
+            t1 = np.where(moving, np.minimum(t1, np.maximum(ta, tb)), t1)
+            t1 = np.where(moving | ((start >= lo) & (start <= hi)), t1, -1.0)    # parallel to the side, outside
+        inside = np.flatnonzero(t0 <= t1)
+        lat0, lat1 = lat0[inside] + t0[inside] * (lat1 - lat0)[inside], lat0[inside] + t1[inside] * (lat1 - lat0)[inside]
+        lng0, lng1 = lng0[inside] + t0[inside] * (lng1 - lng0)[inside], lng0[inside] + t1[inside] * (lng1 - lng0)[inside]
+
+        # pieces at most one bucket long
+        counts = np.maximum(np.ceil(np.maximum(np.abs(lat1 - lat0), np.abs(lng1 - lng0)) / self.bucket_deg), 1).astype(np.int64)
+        if counts.sum() > MAX_ROUTE_BUCKETS:
+            raise ValueError("route passes too many hotspot buckets")
+        segments = np.repeat(inside, counts)
+        piece = np.repeat(np.arange(len(counts)), counts)
+        step = np.arange(len(segments)) - np.repeat(np.cumsum(counts) - counts, counts)
+        f0, f1 = step / counts[piece], (step + 1) / counts[piece]
+        plat0 = lat0[piece] + f0 * (lat1 - lat0)[piece]
+        plat1 = lat0[piece] + f1 * (lat1 - lat0)[piece]
+        plng0 = lng0[piece] + f0 * (lng1 - lng0)[piece]
+        plng1 = lng0[piece] + f1 * (lng1 - lng0)[piece]
+
+        boxes = np.stack([
+            np.floor((np.minimum(plat0, plat1) - dlat) / self.bucket_deg), np.floor((np.maximum(plat0, plat1) + dlat) / self.bucket_deg),
+            np.floor((np.minimum(plng0, plng1) - dlng) / self.bucket_deg), np.floor((np.maximum(plng0, plng1) + dlng) / self.bucket_deg),
+        ], axis=1).astype(np.int64)
+        if ((boxes[:, 1] - boxes[:, 0] + 1) * (boxes[:, 3] - boxes[:, 2] + 1)).sum() > MAX_ROUTE_BUCKETS:
+            raise ValueError("route passes too many hotspot buckets")
+        return boxes, segments
+
+    def pairs(self, boxes, segments):
+        """
+        (cell ids, segment ids): every cell in the buckets of a box, paired with the segment
+        of that box. Only these pairs are measured, so the work follows the cells near
+        each segment instead of all candidates x all segments.
+        """
+        cell_ids = []
+        segment_ids = []
+        for segment, (i0, i1, j0, j1) in zip(segments.tolist(), boxes.tolist()):
+            for i in range(i0, i1 + 1):
+                for j in range(j0, j1 + 1):
+                    ids = self.buckets.get((i, j))
+                    if ids is not None:
+                        cell_ids.append(ids)
+                        segment_ids.append(np.full(len(ids), segment, dtype=np.int64))
+        if not cell_ids:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        return np.concatenate(cell_ids), np.concatenate(segment_ids)
+
+    def candidates(self, lats, lngs, radius_m):
+        """Ids of the cells in buckets within radius_m of any route segment (a superset of the answer)."""
+        lats = np.asarray(lats, dtype=float)
+        lngs = np.asarray(lngs, dtype=float)
+        return np.unique(self.pairs(*self.segment_buckets(lats, lngs, radius_m))[0])
+
+    def near_route(self, lats, lngs, radius_m=100.0):
+        """
+        Hotspots within radius_m meters of the polyline through (lats, lngs), in route order:
+        each cell dict plus 'distance_m' and 'route_index' (the segment / point it is closest to).
+        """
+        lats = np.asarray(lats, dtype=float)
+        lngs = np.asarray(lngs, dtype=float)
+        if not 0 <= radius_m <= MAX_RADIUS_M:
+            raise ValueError(f"radius must be between 0 and {MAX_RADIUS_M:g} meters")
+        if not (np.all(np.abs(lats) <= 90) and np.all(np.abs(lngs) <= 180)):     # also false for nan
+            raise ValueError("latitudes must be within +-90 and longitudes within +-180")
+        if len(lats) == 0 or not self.cells:
+            return []
+
+        # local equirectangular projection in meters, fine at route scale
+        scale_x = METERS_PER_DEGREE * math.cos(math.radians(float(np.mean(lats))))
+        ax, ay = lngs * scale_x, lats * METERS_PER_DEGREE
+        if len(lats) > 1:
+            bx, by = ax[1:], ay[1:]
+            ax, ay = ax[:-1], ay[:-1]
+        else:
+            bx, by = ax, ay
+
+        # route pieces are measured in blocks, keeping only each cell's nearest segment per block,
+        # so memory stays bounded on long routes through dense areas
+        boxes, piece_segments = self.segment_buckets(lats, lngs, radius_m)
+        best = []
+        for start in range(0, len(boxes), SEGMENT_BLOCK):
+            ids, segments = self.pairs(boxes[start:start + SEGMENT_BLOCK], piece_segments[start:start + SEGMENT_BLOCK])
+            if len(ids) == 0:
+                continue
+            px, py = self.lngs[ids] * scale_x, self.lats[ids] * METERS_PER_DEGREE
+            sx, sy = ax[segments], ay[segments]
+            dx, dy = bx[segments] - sx, by[segments] - sy
+            length2 = dx * dx + dy * dy
+            with np.errstate(invalid='ignore', divide='ignore'):
+                t = ((px - sx) * dx + (py - sy) * dy) / length2
+            t = np.clip(np.nan_to_num(t), 0.0, 1.0)         # zero length segments -> their start point
+            dist = np.hypot(px - (sx + t * dx), py - (sy + t * dy))
+            keep = dist <= radius_m
+            best.append(nearest_per_cell(ids[keep], dist[keep], segments[keep]))
+        if not best:
+            return []
+
+        ids, dist, segments = nearest_per_cell(*(np.concatenate(parts) for parts in zip(*best)))
+        order = np.lexsort((dist, segments))
+        return [
+            dict(self.cells[ids[hit]], distance_m=round(float(dist[hit]), 1), route_index=int(segments[hit]))
+            for hit in order
+        ]
+
+
+def nearest_per_cell(ids, dist, segments):
+    """(ids, dist, segments) reduced to each cell's nearest segment (the first one on ties)."""
+    order = np.lexsort((segments, dist, ids))
+    first = order[np.r_[True, ids[order][1:] != ids[order][:-1]]] if len(order) else order
+    return ids[first], dist[first], segments[first]
+
+
+class HotspotIndexFile:
+    """HotspotIndex of a heatmap JSON file, rebuilt when the file changes."""
+
+    def __init__(self, path, **kwargs):
+        self.path = path
+        self.kwargs = kwargs
+        self._index = None
+        self._mtime = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        """Current index, None while the file does not exist."""
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return None
+        with self._lock:
+            if mtime != self._mtime:
+                self._index = HotspotIndex.from_json(self.path, **self.kwargs)
+                self._mtime = mtime
+            return self._index
@@ -0,0 +1,163 @@
+import json
+import math
+import os
+import shutil
+import threading
+from collections import OrderedDict
+
+
+# Accident hotspots as a pyramid of map tiles instead of one JSON with every cell.
+#
+# The 0.001 degree grid of AccidentAnalysis/accidentAnalysis.py is also summed into
+# 0.01 and 0.1 degree cells. Each precision is cut into slippy map tiles (z/x/y) at
+# one tile zoom, and every tile is a small JSON list of cells:
+#     <tiles_dir>/<precision>/<z>/<x>/<y>.json
+# A viewport then only needs the few tiles it overlaps, at the precision its zoom can show.
+
+# grid precision (decimals) -> zoom of the tiles it is cut into
+LEVELS = {1: 10, 2: 12, 3: 14}
+
+MAX_TILES = 1024        # per query, a box needing more is zoomed out too far for its precision
+
+
+def precision_for_zoom(zoom):
+    """Coarsest grid that still looks continuous at this map zoom."""
+    if zoom >= 14:
+        return 3
+    if zoom >= 12:
+        return 2
+    return 1
+
+
+def tile_xy(lat, lng, z):
+    """Slippy map tile containing (lat, lng) at zoom z."""
+    n = 2 ** z
+    lat = max(min(lat, 85.0511), -85.0511)
+    x = int((lng + 180.0) / 360.0 * n)
+    y = int((1.0 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2.0 * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+
+def score(cell):
+    return (cell['deaths'] * 10) + cell['injuries'] + (cell['count'] * 0.1)     # same order as heatmapData
+
+
+def cell_json(lat, lng, data):
+    top_factors = sorted(
+        [{'factor': k, 'count': v} for k, v in data['factors'].items()],
+        key=lambda x: x['count'],
+        reverse=True
+    )[:3]
+    return {
+        'lat': lat,
+        'lng': lng,
+        'count': data['count'],
+        'injuries': data['injuries'],
+        'deaths': data['deaths'],
+        'topFactors': top_factors,
+    }
+
+
+def coarsen(accident_grid, precision):
+    """0.001 degree grid (integer keys, see accidentAnalysis.grid_keys) summed into cells of `precision` decimals."""
+    div = 10 ** (3 - precision)
+    coarse = {}
+    for (lat, lng), data in accident_grid.items():
+        key = (round(lat / div), round(lng / div))
+        cell = coarse.get(key)
+        if cell is None:
+            cell = coarse[key] = {'count': 0, 'injuries': 0, 'deaths': 0, 'factors': {}}
+        cell['count'] += data['count']
+        cell['injuries'] += data['injuries']
+        cell['deaths'] += data['deaths']
+        for factor, count in data['factors'].items():
+            cell['factors'][factor] = cell['factors'].get(factor, 0) + count
+    return coarse
+
+
+def write_tiles(accident_grid, tiles_dir):
+    """
+    Writes the whole pyramid to tiles_dir (replacing the previous one) and returns
+    the number of tiles per precision.
+    """
+    tmp_dir = tiles_dir.rstrip("/\\") + ".tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    written = {}
+    for precision, z in LEVELS.items():
+        scale = 10 ** precision
+        grid = accident_grid if precision == 3 else coarsen(accident_grid, precision)
+
+        tiles = {}
+        for (lat, lng), data in grid.items():
+            cell = cell_json(lat / scale, lng / scale, data)
+            tiles.setdefault(tile_xy(cell['lat'], cell['lng'], z), []).append(cell)
+
+        for (x, y), cells in tiles.items():
+            cells.sort(key=score, reverse=True)
+            tile_dir = os.path.join(tmp_dir, str(precision), str(z), str(x))
+            os.makedirs(tile_dir, exist_ok=True)
+            with open(os.path.join(tile_dir, f"{y}.json"), 'w') as f:
+                json.dump(cells, f, separators=(',', ':'))
+        written[precision] = len(tiles)
+
+    with open(os.path.join(tmp_dir, "levels.json"), 'w') as f:
+        json.dump({str(precision): z for precision, z in LEVELS.items()}, f)
+
+    # swap in the new pyramid, readers see either the old or the new one
+    old_dir = tiles_dir.rstrip("/\\") + ".old"
+    shutil.rmtree(old_dir, ignore_errors=True)
+    if os.path.exists(tiles_dir):
+        os.replace(tiles_dir, old_dir)
+    os.replace(tmp_dir, tiles_dir)
+    shutil.rmtree(old_dir, ignore_errors=True)
+    return written
+
+
+class HotspotTiles:
+    """Reads the cells of a bounding box from a tile pyramid, keeping recently used tiles in memory."""
+
+    def __init__(self, tiles_dir, max_tiles=2048):
+        self.tiles_dir = tiles_dir
+        self.max_tiles = max_tiles
+        self._tiles = OrderedDict()     # (path, mtime) -> list of cells
+        self._lock = threading.Lock()
+
+    def tile(self, precision, z, x, y):
+        path = os.path.join(self.tiles_dir, str(precision), str(z), str(x), f"{y}.json")
+        try:
+            key = (path, os.path.getmtime(path))      # a rebuilt pyramid has new mtimes
+        except OSError:
+            return []       # no accidents in this tile
+        with self._lock:
+            if key in self._tiles:
+                self._tiles.move_to_end(key)
+                return self._tiles[key]
+        with open(path) as f:
+            cells = json.load(f)
+        with self._lock:
+            self._tiles[key] = cells
+            while len(self._tiles) > self.max_tiles:
+                self._tiles.popitem(last=False)
+        return cells
+
+    def query(self, south, west, north, east, zoom, limit=None):
+        """(precision, cells inside the box ordered by severity), at most `limit` cells."""
+        if not (-90 <= south <= north <= 90 and -180 <= west <= east <= 180):     # also false for nan
+            raise ValueError("bbox must be south,west,north,east within -90..90 and -180..180")
+        precision = precision_for_zoom(zoom)
+        z = LEVELS[precision]
+        x0, y0 = tile_xy(north, west, z)        # tile y grows southwards
+        x1, y1 = tile_xy(south, east, z)
+        if (x1 - x0 + 1) * (y1 - y0 + 1) > MAX_TILES:
+            raise ValueError("Bounding box too large for this zoom")
+
+        cells = [
+            cell
+            for x in range(x0, x1 + 1)
+            for y in range(y0, y1 + 1)
+            for cell in self.tile(precision, z, x, y)
+            if south <= cell['lat'] <= north and west <= cell['lng'] <= east
+        ]
+        cells.sort(key=score, reverse=True)
+        return precision, cells[:limit] if limit else cells
@@ -0,0 +1,56 @@
+import numpy as np
+import pandas as pd
+
+
+# Derived columns are computed once here, at load time. After this the frames are
+# shared read-only by every request thread - handlers must not add or rewrite columns.
+
+
+def prepare_volume(df):
+    """
+    Adds the derived columns of the traffic volume frame and returns it sorted by time.
+
+    date      -> datetime64 day of the count, built from Yr / M / D without going through strings
+    date_key  -> the same day as an int32 yyyymmdd, for cheap comparisons
+    The rows come back ordered by (date_key, HH, MM), see date_range().
+    """
+    parts = df[['Yr', 'M', 'D']].astype('int32')
+    df['date'] = pd.to_datetime(parts.rename(columns={'Yr': 'year', 'M': 'month', 'D': 'day'}))
+    df['date_key'] = (parts['Yr'] * 10000 + parts['M'] * 100 + parts['D']).astype('int32')
+
+    df['Hour_Group'] = ((df['HH'] // 3) * 3).astype('int8')     # 3-hour buckets for the dashboard
+
+    # stable, so counts of the same minute keep their file order
+    return df.sort_values(['date_key', 'HH', 'MM'], kind='stable', ignore_index=True)
+
+
+def date_range(df, start, end):
+    """
+    Rows of a prepared volume frame with start <= date <= end (inclusive days).
+
+    Two binary searches on the sorted date_key, the result is a slice of the frame.
+    """
+    keys = df['date_key'].to_numpy()
+    lo = keys.searchsorted(date_key(start), side='left')
+    hi = keys.searchsorted(date_key(end), side='right')
+    return df.iloc[lo:hi]
+
+
+def date_key(day):
+    day = pd.Timestamp(day)
+    return day.year * 10000 + day.month * 100 + day.day
+
+
+def prepare_accidents(df_acc):
+    """Adds the derived columns of the collisions frame (in place) and returns it."""
+    # converts 'Time' to datetime obj, and extracts hr part - each distinct time is parsed once
+    # a missing Time (code -1) stays missing (nullable Int8) and is left out of the hourly counts
+    times = df_acc['Time'].astype('category')
+    hours = pd.to_datetime(times.cat.categories, format='%H:%M:%S').hour.to_numpy()
+    codes = times.cat.codes.to_numpy()
+    hour = pd.array(np.append(hours, 0)[codes].astype('int8'), dtype='Int8')
+    hour[codes < 0] = pd.NA
+    df_acc['Hour'] = hour
+    df_acc['Date'] = pd.to_datetime(df_acc['Date'])
+    df_acc['Month'] = df_acc['Date'].dt.to_period('M')
+    return df_acc
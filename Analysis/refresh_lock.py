@@ -0,0 +1,43 @@
+import os
+import threading
+
+try:
+    import fcntl
+except ImportError:         # Windows: no gunicorn there, the dev server is a single process
+    fcntl = None
+
+
+# Open lock files of this process, path -> file. flock locks belong to the open file, so
+# a second open of the same path in this process would be refused its own lock.
+_held = {}
+_held_lock = threading.Lock()
+
+
+class RefreshLock:
+    """
+    Decides which process runs a refresher when several share its files (the gunicorn
+    workers of gunicorn.conf.py, the prediction backend): the one holding an exclusive,
+    non-blocking flock on `path`. It is kept for the life of the process and released by
+    the OS when that process exits, so the next worker to ask takes over.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def acquire(self):
+        """True if this process holds the lock (taking it if it is free)."""
+        with _held_lock:
+            if self.path in _held:
+                return True
+            if fcntl is None:
+                _held[self.path] = None
+                return True
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            f = open(self.path, "a")
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:     # another process refreshes
+                f.close()
+                return False
+            _held[self.path] = f
+            return True
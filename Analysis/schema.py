@@ -0,0 +1,87 @@
+import logging
+
+import pandas as pd
+
+
+# Column types of the volume and collision frames. Strings that repeat millions of
+# times are categoricals (one code per row instead of one python str), numbers are
+# stored in the smallest type that holds them.
+#
+# A schema maps column -> dtype. Columns missing from a frame are skipped.
+
+VOLUME_SCHEMA = {
+    'Boro': 'category',
+    'street': 'category',
+    'fromSt': 'category',
+    'toSt': 'category',
+    'Direction': 'category',
+    'WktGeom': 'category',
+    'Yr': 'int16',
+    'M': 'int8',
+    'D': 'int8',
+    'HH': 'int8',
+    'MM': 'int8',
+}
+
+COLLISION_SCHEMA = {
+    'Borough': 'category',
+    'Street Name': 'category',
+    'Cross Street': 'category',
+    'Contributing Factor': 'category',
+    'Vehicle Type': 'category',
+    'Time': 'category',
+    'Persons Injured': 'int16',
+    'Persons Killed': 'int16',
+}
+
+# Columns some endpoint (or the derivation of one) reads, derived columns included.
+# Everything else can be dropped at load.
+VOLUME_COLUMNS = ['Boro', 'street', 'Yr', 'M', 'D', 'HH', 'MM', 'Vol', 'date', 'date_key', 'Hour_Group']
+COLLISION_COLUMNS = [
+    'Date', 'Time', 'Borough', 'Street Name', 'Latitude', 'Longitude',
+    'Contributing Factor', 'Vehicle Type', 'Persons Injured', 'Persons Killed', 'Hour', 'Month',
+]
+
+
+def memory_mb(df):
+    return df.memory_usage(deep=True).sum() / 2**20
+
+
+def read_dtypes(schema, columns=None):
+    """dtype= for pd.read_csv: only the categoricals, so the strings are never held as objects.
+
+    Numbers are downcast after reading, when it is known that they have no missing values.
+    """
+    return {
+        column: dtype for column, dtype in schema.items()
+        if dtype == 'category' and (columns is None or column in columns)
+    }
+
+
+def apply_schema(df, schema, columns=None, name="frame"):
+    """
+    Returns `df` with the schema types, keeping only `columns` when given.
+
+    Integer columns outside the schema are downcast too. Integer types from the
+    schema are only applied to columns without missing values.
+    """
+    before = memory_mb(df)
+    if columns is not None:
+        df = df[[column for column in df.columns if column in columns]]
+
+    dtypes = {}
+    for column in df.columns:
+        dtype = schema.get(column)
+        if dtype == 'category':
+            if not isinstance(df[column].dtype, pd.CategoricalDtype):
+                dtypes[column] = dtype
+        elif dtype is not None:
+            if df[column].notna().all():
+                dtypes[column] = dtype
+        elif pd.api.types.is_integer_dtype(df[column].dtype) and len(df):
+            dtypes[column] = pd.to_numeric(df[column], downcast='integer').dtype
+    df = df.astype(dtypes)
+
+    logging.info(f"Schema {name}: {before:.0f} MB -> {memory_mb(df):.0f} MB")
+    return df
+
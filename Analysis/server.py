@@ -1,22 +1,32 @@
 import base64
 import io
-from flask import Flask, request, jsonify
+import logging
+import numbers
+import os
+from flask import Flask, Response, request, jsonify
 import matplotlib
 import pandas as pd
 from flask_cors import CORS
 import matplotlib.pyplot as plt
 import matplotlib.colors as mcolors
-import requests
 import seaborn as sns
 import joblib
 
 from datetime import datetime, timedelta, timezone
 
 # functions 
-from dashb import traffic
-from blockage import scrape_blockage
+from dashb import MaterializedDashboard
+from blockage import BlockageStore
 from json_read import json_to_csv
-from peak import peak_hour_func
+from peak import peak_hour_from_hourly
+from street_store import build_street_store
+import datasets
+from street_index import StreetIndex, normalize_street
+from charts import ChartCache, Prerenderer
+from hotspot_tiles import HotspotTiles
+from hotspot_index import HotspotIndexFile, MAX_RADIUS_M
+from weather_store import WeatherStore, CurrentWeather
+import charts
 matplotlib.use('Agg')  # Use a non-GUI backend
 
 from paths import (
@@ -44,24 +54,197 @@ import json
 #     data = json.load(f)
 # speeds = json_to_csv(data)
 
-# Volume data
-df = pd.read_csv(VOLUME_DATA_PATH)
-df['Yr'] = df['Yr'].astype(str)     # convert to string
-df['M'] = df['M'].astype(str)
-df['D'] = df['D'].astype(str)
+# Volume data and Accident data, with every derived column (date, date_key, Hour_Group, Hour, Month)
+# already added - request handlers only read these frames, so threads can share them.
+# Loaded from the Feather files written by `python datasets.py` when present (seconds instead of minutes),
+# typed by schema.py and without the columns no endpoint reads
+df = datasets.load('volume', columns=True)
+df_acc = datasets.load('collisions', columns=True)
 
-df['date'] = df[['Yr', 'M', 'D']].agg('-'.join, axis=1)     #new col added with combind date
+# normalized street names -> rows, so "Fdr Drive" / "FDR DRIVE" / "Cross Bronx Expy" resolve to one street
+street_index = StreetIndex()
+street_index.add('volume', df['street'])
+street_index.add('collisions', df_acc['Street Name'])
 
-# Accident data
-df_acc = pd.read_csv(ACCIDENT_DATA_PATH)
-df_acc['Hour'] = pd.to_datetime(df_acc['Time'], format='%H:%M:%S').dt.hour  # Hour column
-# converts 'Time' to datetime obj, and extracts hr part using dt.hour
+# per street aggregates, so /street_analysis doesnt scan both frames on every request
+street_store = build_street_store(df, df_acc, street_index)
+
+# changes whenever the datasets are (re)loaded, cached charts of older data are never served
+DATA_VERSION = datetime.now().isoformat()
+
+# rendered charts, keyed by (street key, chart type, data version), titled with the street's display name
+CHART_CACHE_SIZE = 1024
+chart_cache = ChartCache(max_entries=CHART_CACHE_SIZE)
+
+
+def series_to_dict(series):
+    """Numeric series -> {key: value} with plain python numbers (non finite values become null)."""
+    return {
+        (int(key) if isinstance(key, numbers.Real) and float(key).is_integer() else str(key)):
+        (float(value) if pd.notna(value) and abs(value) != float('inf') else None)
+        for key, value in series.items()
+    }
+
+
+def cached_chart(street_key, chart_type, render, *args):
+    """Chart from the cache, only drawn with matplotlib on a miss."""
+    return chart_cache.get((street_key, chart_type, DATA_VERSION), lambda: render(*args))
+
+
+def display_name(street_key):
+    """Title of a street's charts: its most common spelling in the datasets, one per key."""
+    return street_index.name(street_key, street_key)
+
+
+def cached_risk_plot(street_key):
+    return lambda *args: cached_chart(street_key, "risk_plot", charts.risk_plot, *args)
+
+
+def render_street_charts(street_key):
+    """Draws every chart of one street record into the cache (used by the prerender worker)."""
+    record = street_store.get(street_key)
+    if record is None:
+        return
+    volume = record["volume"]
+    acc = record["accidents"]
+
+    if volume is not None:
+        cached_chart(street_key, "hour_plot", charts.hour_plot, display_name(street_key), volume["hourly_volume"])
+    if acc is not None:
+        cached_chart(street_key, "accidents", charts.accidents_by_hour_plot, acc["hourly_accidents"])
+        cached_chart(street_key, "vehicle_types", charts.vehicle_types_plot, acc["vehicle_types"])
+    if record["merged"] is not None:
+        cached_chart(street_key, "corr_scatter", charts.correlation_plot, record["merged"])
+    if volume is not None and acc is not None:
+        peak_hour_from_hourly(
+            display_name(street_key),
+            volume["hourly_volume_total"],
+            acc["hourly_accidents"].rename(columns={'Accident_Count': 'Accidents'}),
+            render=cached_risk_plot(street_key)
+        )
+
+
+# renders charts of the most requested streets off the request thread
+prerenderer = Prerenderer(render_street_charts)
+
+# /traffic-analysis only changes when the datasets do, so it is built once per DATA_VERSION
+dashboard = MaterializedDashboard()
+
+# scraped road closures, refreshed in the background instead of on every request
+# BLOCKAGE_FIXTURE=<saved page.html> parses a local copy instead (offline testing, eg BLOCKAGE_FIXTURE=fixtures/advisories.html)
+blockage_store = BlockageStore(
+    cache_dir=os.environ.get("BLOCKAGE_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache")),
+    refresh_interval=int(os.environ.get("BLOCKAGE_REFRESH_SECONDS", 3600)),
+    fixture_path=os.environ.get("BLOCKAGE_FIXTURE"),
+)
+
+# accident hotspot pyramid written by AccidentAnalysis/accidentAnalysis.py (update_hotspots(..., tiles_dir=...))
+hotspot_tiles = HotspotTiles(
+    os.environ.get("HOTSPOT_TILES_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache", "hotspot_tiles"))
+)
+
+# spatial index over the heatmap JSON (accidentAnalysis.py output), for hotspots along a route
+hotspot_index = HotspotIndexFile(
+    os.environ.get("HOTSPOTS_JSON", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "assets", "nyc_accident_hotspots.json"))
+)
+
+# weather shared with the enrichment job and the prediction backend (weather_store.py),
+# current conditions are refreshed in the background every WEATHER_TTL_SECONDS instead of
+# once at import; model/backend.py picks every refresh up from the store
+weather_store = WeatherStore()
+current_weather = CurrentWeather(weather_store, ttl=int(os.environ.get("WEATHER_TTL_SECONDS", 900)))
+
+
+def warm_caches():
+    """
+    Builds the dashboard and renders the charts of the busiest streets, in the calling thread.
+    gunicorn.conf.py runs it once in the master, so the forked workers share the results.
+    """
+    # the streets with the most accidents, later the prerenderer follows what users ask for
+    busiest = sorted(
+        (key for key, record in street_store.items() if record["accidents"] is not None),
+        key=lambda key: street_store[key]["accidents"]["total_accidents"],
+        reverse=True
+    )
+    for street_key in busiest[:prerenderer.top_n]:
+        try:
+            render_street_charts(street_key)
+        except Exception as e:
+            logging.error(f"Error prerendering charts for {street_key}: {e}")
+    try:
+        dashboard.get(df, df_acc, DATA_VERSION)
+    except Exception as e:      # built again on the first request
+        logging.error(f"Error building the dashboard: {e}")
+
+
+def start_background_jobs():
+    # threads of one process (a gunicorn worker), the refreshers only fetch where they hold their lock
+    prerenderer.start()
+    blockage_store.start()
+    current_weather.start()
 
 
 @app.route('/traffic-analysis', methods=['GET','POST'])
 def traffic_analysis():
-    dashboard = traffic(df, df_acc)
-    return dashboard
+    # format=data -> skip the rendered bar charts, the numbers are already in the response
+    include_graphs = request.args.get("format") != "data"
+    try:
+        body = dashboard.get(df, df_acc, DATA_VERSION, include_graphs)
+    except Exception as e:
+        logging.error(f"Error processing data: {e}")
+        return jsonify({"error": "Failed to process data"}), 500
+    return Response(body, mimetype="application/json")
+
+
+@app.route("/hotspots", methods=["GET"])
+def hotspots():
+    # only the cells of the visible map, at a grid precision that fits the zoom
+    # eg -> /hotspots?bbox=40.70,-74.02,40.78,-73.93&zoom=14   (south,west,north,east)
+    try:
+        south, west, north, east = (float(value) for value in request.args.get("bbox", "").split(","))
+        zoom = int(request.args.get("zoom", 12))
+        limit = request.args.get("limit", type=int)
+    except ValueError:
+        return jsonify({"error": "bbox=south,west,north,east and an integer zoom required"}), 400
+    if not (-90 <= south <= north <= 90 and -180 <= west <= east <= 180):     # also false for nan / inf
+        return jsonify({"error": "bbox must be south,west,north,east within -90..90 and -180..180"}), 400
+
+    try:
+        precision, cells = hotspot_tiles.query(south, west, north, east, zoom, limit)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"gridPrecision": precision, "heatmapData": cells})
+
+
+@app.route("/route_hotspots", methods=["POST"])
+def route_hotspots():
+    # same route_points as /predict_route, plus how far from the route a hotspot may be (meters)
+    data = request.json or {}
+    route_points = data.get("route_points", [])
+    try:
+        lats = [float(point["latitude"]) for point in route_points]
+        lons = [float(point["longitude"]) for point in route_points]
+    except (KeyError, TypeError, ValueError):
+        return jsonify({"error": "route_points with latitude / longitude required"}), 400
+    if not all(-90 <= lat <= 90 for lat in lats) or not all(-180 <= lon <= 180 for lon in lons):     # also false for nan
+        return jsonify({"error": "latitude must be within -90..90 and longitude within -180..180"}), 400
+    try:
+        radius = float(data.get("radius", 100))
+    except (TypeError, ValueError):
+        radius = float('nan')
+    if not 0 <= radius <= MAX_RADIUS_M:          # also false for nan
+        return jsonify({"error": f"radius must be a number of meters between 0 and {MAX_RADIUS_M:g}"}), 400
+
+    index = hotspot_index.get()
+    if index is None:
+        return jsonify({"error": "Hotspot data not available"}), 503
+
+    # hotspots in the order the route passes them, with counts, injuries, deaths and top factors
+    try:
+        hotspots = index.near_route(lats, lons, radius)
+    except ValueError as e:     # routes that would walk more than MAX_ROUTE_BUCKETS buckets
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"radius": radius, "hotspots": hotspots})
 
 
 @app.route("/blockages", methods=["GET"])
@@ -71,23 +254,19 @@ def blockage():             # same code as Street analysis blockage
     if not street:
         return jsonify({"error": "Street name required"}), 400
     
-    block = scrape_blockage()       # returns cleaned scraped df
-    blocked = block[block['From Street'].str.lower().str.contains(street.lower()) | block['To Street'].str.lower().str.contains(street.lower())]    #filtered for street
-    blocked['To Date'] = pd.to_datetime(blocked['To Date'], errors='coerce')        #ensures that invalid dates are set to NaT to avoid errors
-    blocked['month'] = pd.to_datetime(blocked['From Date'], errors='coerce').dt.month
+    # matching closures and their stats from the index built on each refresh, no scan of the scraped df
+    blockages = blockage_store.search(street)
 
     response = {}
     response["street_name"] = street
-    if not blocked.empty:   
-        # total_blockages = blocked['Reason'].nunique()
-        total_blockages = blocked.groupby(['Reason', 'From Street', 'To Street', 'From Date', 'To Date'])['Time'].count().count()  #gives total unique blockages from data
+    if blockages is not None:
+        blocked = blockages["rows"]
         active_blockages = blocked[blocked['To Date'] >= pd.Timestamp.today()].to_dict(orient='records')    # gives blockages whose end date are yet to come ,.. thus active
         # orient - converts the DataFrame into a list of dictionaries, where each row(record) becomes a dictionary
-        com_reason = blocked['Reason'].value_counts().head(5).to_dict()        # gives most common reasons of blockage
         response["blockages"] = {
-            "total_blockages": int(total_blockages),
+            "total_blockages": blockages["total_blockages"],      # unique blockages
             "active_blockages": active_blockages,
-            "com_reason": com_reason,
+            "com_reason": blockages["com_reason"],                # most common reasons of blockage
         }
 
     return(response)
@@ -95,65 +274,57 @@ def blockage():             # same code as Street analysis blockage
 @app.route("/street_analysis", methods=["GET"])         #as were fetching the street input from the UI
 def street_analysis():
     street = request.args.get("street")     #fetch street name from req
+    # format=data -> numeric series instead of rendered PNGs, the app draws them with syncfusion charts
+    as_data = request.args.get("format") == "data"
 
     if not street:
         return jsonify({"error": "Street name required"}), 400
 
-    # filter the datasets for the input street, so processing kum ho jayega
-    street_data = df[df["street"].str.upper() == street.upper()]  # Case insensitive            # Volume data
-    street_acc = df_acc[df_acc["Street Name"].str.upper() == street.upper()]        # Accidents data
+    # precomputed record for the input street, so no filtering of the full datasets per request
+    street_key = normalize_street(street)
+    record = street_store.get(street_key, {})
+    volume = record.get("volume")           # Volume data
+    acc = record.get("accidents")           # Accidents data
     # street_speed = speeds[speeds["street_name"].str.upper() == street.upper()]        # Speeds dataset (Tom Tom august 24)
+    if record:
+        prerenderer.record_hit(street_key)
 
     street_name = street.upper()
-    boro = street_data['Boro'].unique()         # take the first boro
 
 
     # blockage dataset
-    block = scrape_blockage()       # returns cleaned scraped df
-    blocked = block[block['From Street'].str.lower().str.contains(street.lower()) | block['To Street'].str.lower().str.contains(street.lower())]    #filtered for street
-    blocked['To Date'] = pd.to_datetime(blocked['To Date'], errors='coerce')        #ensures that invalid dates are set to NaT to avoid errors
-    blocked['month'] = pd.to_datetime(blocked['From Date'], errors='coerce').dt.month
-
+    blockages = blockage_store.search(street)      # indexed closures + precomputed stats, kept fresh in the background
 
-    if boro.ndim > 1:
-        boro = boro[0]
 
     response = {}
     response["street_name"] = street_name
-    if not blocked.empty:
-        # total_blockages = blocked['Reason'].nunique()
-        total_blockages = blocked.groupby(['Reason', 'From Street', 'To Street', 'From Date', 'To Date'])['Time'].count().count()  #gives total unique blockages from data
+    if blockages is not None:
+        blocked = blockages["rows"]
         active_blockages = blocked[blocked['To Date'] >= pd.Timestamp.today()].to_dict(orient='records')    # gives blockages whose end date are yet to come ,.. thus active
         # orient - converts the DataFrame into a list of dictionaries, where each row(record) becomes a dictionary
-        com_reason = blocked['Reason'].value_counts().head(5).to_dict()        # gives most common reasons of blockage
-        # to dict makes it easy to work with json 
-        monthly_blockages = blocked.groupby('month').size()
-
-        plt.figure(figsize=(10, 6)) # w x h
-        monthly_blockages.plot(kind='bar')
-        plt.title(f"Monthly Blockage Patterns for {street}")
-        plt.xlabel("Month")
-        plt.ylabel("Number of Blockages")
-        img_io = io.BytesIO()
-        # saves image in binary stream .. so as to avoid saving as a file on disk
-        plt.savefig(img_io, format="png", bbox_inches="tight")
-        img_io.seek(0)   # moves pointer to the start of bytes stream to avoid errors
-        monthly_pattern = base64.b64encode(img_io.getvalue()).decode("utf-8")       # encode in base64 format and decode it to a string
-        # encode and decode as josn doesnt support binary data, 
-        plt.close()
+        monthly_blockages = blockages["monthly_blockages"]
 
         response["blockages"] = {
-            "total_blockages": int(total_blockages),
+            "total_blockages": blockages["total_blockages"],
             "active_blockages": active_blockages,
-            "com_reason": com_reason,
-            "monthly_pattern":monthly_pattern,
+            "com_reason": blockages["com_reason"],
         }
+        if as_data:
+            response["blockages"]["monthly_blockages"] = series_to_dict(monthly_blockages)
+        else:
+            # the scraped page changes independently of the datasets, so its counts are the version
+            response["blockages"]["monthly_pattern"] = chart_cache.get(
+                (street_key, "monthly_blockages", tuple(monthly_blockages.items())),
+                lambda: charts.monthly_blockages_plot(display_name(street_key), monthly_blockages)
+            )
 
-    if not street_data.empty:
+    if volume is not None:
         # return jsonify({"error": "No data found for this street"}), 404
+        hourly_volume = volume["hourly_volume"]     # street, HH, mean Vol
+
         # Most congested hour
         most_congested = dict(
-            street_data.groupby('street').apply(lambda x: x.groupby('HH')['Vol'].mean().agg(['idxmax','max'])).reset_index()
+            hourly_volume.groupby('street').apply(lambda x: x.set_index('HH')['Vol'].agg(['idxmax','max'])).reset_index()
             .to_dict()
         ) 
         # to_dict might give pandas specific dictionary ... dict() helps ensure its a standard python dictionary
@@ -161,199 +332,85 @@ def street_analysis():
 
         # Least congested hour
         least_congested = dict(
-            street_data.groupby('street').apply(lambda x: x.groupby('HH')['Vol'].mean().agg(['idxmin','min'])).reset_index()
+            hourly_volume.groupby('street').apply(lambda x: x.set_index('HH')['Vol'].agg(['idxmin','min'])).reset_index()
             .to_dict()
         )
 
         # Volume in boro
         # boro_volume = dict(street_data.groupby('Boro').apply(lambda x: x[x['Boro'] == boro])['Vol'].mean().to_dict())
 
-        # Traffic volume per hour plot
-        plt.figure(figsize=(12, 6))
-        sns.lineplot(data=street_data.groupby(by=['street','HH'])['Vol'].mean().reset_index(), x="HH", y="Vol")
-        plt.xlabel("Hour of the Day")
-        plt.ylabel("Average Traffic Volume")
-        plt.title(f"Traffic Volume for {street}")
-        plt.xticks(rotation=45)
-
-        img_io = io.BytesIO()
-        plt.savefig(img_io, format="png", bbox_inches="tight")
-        img_io.seek(0)
-        img_base64 = base64.b64encode(img_io.getvalue()).decode("utf-8")
-        plt.close()
-
         response["volume_metrics"] = {
             "most_congested_hour": most_congested,
             "least_congested_hour": least_congested,
-            "hour_plot": img_base64,
         }
+        if as_data:
+            response["volume_metrics"]["hourly_volume"] = series_to_dict(hourly_volume.groupby('HH')['Vol'].mean())
+        else:
+            # Traffic volume per hour plot
+            response["volume_metrics"]["hour_plot"] = cached_chart(street_key, "hour_plot", charts.hour_plot, display_name(street_key), hourly_volume)
 
     # Safety metrics
-    if not street_acc.empty:
+    if acc is not None:
     #     return jsonify({"error": "No Accident data found for this street"}), 404
     # else:
 
         # -------------------------------------------
         # Calculate safety metrics
-        total_accidents = len(street_acc)
-        total_injuries = street_acc['Persons Injured'].sum()
-        total_fatalities = street_acc['Persons Killed'].sum()
+        total_accidents = acc["total_accidents"]
+        total_injuries = acc["total_injuries"]
+        total_fatalities = acc["total_fatalities"]
         if total_accidents > 0:
             severity_ratio = ((total_injuries + total_fatalities) / total_accidents)
             # eg -> 1.7 -> each accident results in 1.7 injuries or fatalities
         else:   
             severity_ratio = 0
 
-        # --------------------------------------------
-        # Hourly Accidents
-        hourly_accidents = street_acc.groupby('Hour').size().reset_index(name='Accident_Count')
-
-        # find the hour with the most accidents
-        peak_hour = hourly_accidents['Accident_Count'].idxmax()
-        colors = [mcolors.to_rgba('red', 1.0) if hour == peak_hour else mcolors.to_rgba('pink') for hour in hourly_accidents['Hour']]
-
-        # plot accidents by hour
-        plt.figure(figsize=(10, 5))
-        sns.barplot(x=hourly_accidents['Hour'], y=hourly_accidents['Accident_Count'], palette=colors)
-        plt.xlabel("Hour of the Day")
-        plt.ylabel("Number of Accidents")
-        plt.title("Accidents by Hour of the Day")
-        plt.xticks(range(24))
-        plt.grid(axis='y', linestyle='--', alpha=0.7)
-
-        img_io = io.BytesIO()
-        plt.savefig(img_io, format="png", bbox_inches="tight")
-        img_io.seek(0)
-        accidents = base64.b64encode(img_io.getvalue()).decode("utf-8")
-        plt.close()
-        # -------------------------------------------
-
-        # -------------------------------------------
-        # Weekly Accidents
-        # weekly_accidents = 1
-        # street_acc['Day_of_Week'].value_counts()
-
-        # plt.figure(figsize=(10, 5))
-        # sns.barplot(x=weekly_accidents.index, y=weekly_accidents.values, palette="viridis")
-        # plt.xlabel("Day of the Week")
-        # plt.ylabel("Number of Accidents")
-        # plt.title("Accidents by Day of the Week")
-        # plt.xticks(rotation=45)
-        # plt.grid(axis='y', linestyle='--', alpha=0.7)
-
-        # img_io = io.BytesIO()
-        # plt.savefig(img_io, format="png", bbox_inches="tight")
-        # img_io.seek(0)
-        # weekly_accidents_img = base64.b64encode(img_io.getvalue()).decode("utf-8")
-        # plt.close()
-        # -------------------------------------------
-
-        # -------------------------------------------
-        # Most Involved Vehicle Types
-        vehicle_types = street_acc['Vehicle Type'].value_counts().head(10)
-
-        plt.figure(figsize=(10, 5))
-        sns.barplot(x=vehicle_types.values, y=vehicle_types.index, palette="coolwarm")
-        plt.xlabel("Number of Accidents")
-        plt.ylabel("Vehicle Type")
-        plt.title("Top 10 Vehicle Types Involved in Accidents")
-        plt.grid(axis='x', linestyle='--', alpha=0.7)
-
-        img_io = io.BytesIO()
-        plt.savefig(img_io, format="png", bbox_inches="tight")
-        img_io.seek(0)
-        vehicle_types_img = base64.b64encode(img_io.getvalue()).decode("utf-8")
-        plt.close()
-        # -------------------------------------------
         response["safety_metrics"] = {
-        "vehicle_types": vehicle_types_img,
         "total_accidents": int(total_accidents),
         "total_injuries": int(total_injuries),
         "total_fatalities": int(total_fatalities),
         "severity_ratio": round(severity_ratio, 2),
-        "accidents": accidents,
         }
+
+        if as_data:
+            response["safety_metrics"]["hourly_accidents"] = series_to_dict(acc["hourly_accidents"].set_index('Hour')['Accident_Count'])
+            response["safety_metrics"]["vehicle_types"] = series_to_dict(acc["vehicle_types"])
+        else:
+            # --------------------------------------------
+            # Hourly Accidents, peak hour highlighted
+            response["safety_metrics"]["accidents"] = cached_chart(street_key, "accidents", charts.accidents_by_hour_plot, acc["hourly_accidents"])
+
+            # -------------------------------------------
+            # Weekly Accidents
+            # weekly_accidents = 1
+            # street_acc['Day_of_Week'].value_counts()
+            # -------------------------------------------
+
+            # -------------------------------------------
+            # Most Involved Vehicle Types
+            response["safety_metrics"]["vehicle_types"] = cached_chart(street_key, "vehicle_types", charts.vehicle_types_plot, acc["vehicle_types"])
+            # -------------------------------------------
     
-        if not street_data.empty:
-            street_acc['Hour'] = pd.to_datetime(street_acc['Time'], format='%H:%M:%S').dt.hour  # Extract hour
-            hourly_accidents = street_acc.groupby(['Street Name', 'Hour']).size().reset_index(name='accident_count')
-
-            hourly_volume = street_data.groupby(['street', 'HH'])['Vol'].mean().reset_index()
-            # Convert street names to lowercase for consistency
-            hourly_volume['street'] = hourly_volume['street'].str.lower()
-            hourly_accidents['Street Name'] = hourly_accidents['Street Name'].str.lower()
-            merged_data = pd.merge(
-                hourly_volume,
-                hourly_accidents,
-                left_on=['street', 'HH'],
-                right_on=['Street Name', 'Hour'],
-                how='left'          #keeps all rows from hourly_volume (traffic volume data), even if no accidents occurred for that hour
-            )
-            merged_data = merged_data[merged_data['Street Name'].notna()]       #remove unmatched rows with NaN
+        if record["merged"] is not None:
+            merged_data = record["merged"]
             corr = merged_data['Vol'].corr(merged_data['accident_count'])
-            
-            plt.figure(figsize=(8,6))
-            # Scatter plot with trend line
-            sns.regplot(x=merged_data['Vol'], y=merged_data['accident_count'], 
-                        scatter_kws={'s': 10, 'alpha': 0.5},  # Adjust dot size and transparency
-                        line_kws={'color': 'red'},  # Make the trend line red
-                        lowess=False)  # Use locally weighted regression for a smooth trend
-            # A linear regression trend line shows the overall pattern.
-            # If sloped upwards → More traffic leads to more accidents.
-
-            plt.xlabel("Traffic Volume")
-            plt.ylabel("Accident Count")
-            plt.title("Traffic Volume vs Accident Count with Trend Line")
-            img = io.BytesIO()
-            plt.savefig(img, format='png')
-            img.seek(0)
-            corr_scatter = base64.b64encode(img.getvalue()).decode()
             response['correlation'] = {
                 "corr":corr,
-                "corr_scatter":corr_scatter,
             }
-
-        if not street_data.empty:
-            risk_analysis = peak_hour_func(street, street_data, street_acc)
+            if not as_data:     # in data mode the app plots hourly_volume against hourly_accidents itself
+                response['correlation']["corr_scatter"] = cached_chart(street_key, "corr_scatter", charts.correlation_plot, merged_data)
+
+        if volume is not None:
+            risk_analysis = peak_hour_from_hourly(
+                display_name(street_key),
+                volume["hourly_volume_total"],
+                acc["hourly_accidents"].rename(columns={'Accident_Count': 'Accidents'}),
+                render=None if as_data else cached_risk_plot(street_key)
+            )
             response['risk_analysis'] = risk_analysis
 
     return(response)
 
-def fetch_weather_data():
-    url = "https://api.open-meteo.com/v1/forecast"
-    params = {
-        "latitude": 40.7128,  # New York City Latitude
-        "longitude": -74.0060,  # New York City Longitude
-        "hourly": ["temperature_2m", "precipitation", "windspeed_10m"],
-        "current_weather": True,
-        "timezone": "America/New_York"
-    }
-    try:
-        response = requests.get(url, params=params)
-        response.raise_for_status()
-        data = response.json()
-        current_weather = data.get("current_weather", {})
-        return {
-            "temp_max": current_weather.get("temperature", 25),
-            "temp_min": current_weather.get("temperature", 15),
-            "precipitation": current_weather.get("precipitation", 0.1),
-            
-            "rain": 1 if current_weather.get("precipitation", 0) > 0 else 0,
-            "snow": 0 ,
-            "windspeed_max": current_weather.get("windspeed", 15),
-        }
-    except requests.RequestException as e:
-        print(f"Weather API request failed: {e}")
-        return {  # Dummy fallback data
-            "temp_max": 25,
-            "temp_min": 15,
-            "precipitation": 0.1,
-            "rain": 0,
-            "snow": 0,
-            "windspeed_max": 15
-        }
-
-weather_data = fetch_weather_data()
 """
 def predict_traffic(lat,lon,hour, minute):
     try:
@@ -362,7 +419,7 @@ def predict_traffic(lat,lon,hour, minute):
     "Longitude": lon, 
     "HH": hour, 
     "MM": minute, 
-    **weather_data 
+    **current_weather.get() 
 }])
 
         predicted_volume = model.predict(input_data)[0]
@@ -505,6 +562,9 @@ def predict_future():
 """
 if __name__ == '__main__':          #prevents the server from starting unintentionally when the file is not the main file
     # The file you execute using python <filename>.py is treated as the main file.
+    # (development only - for several worker processes use: gunicorn -c gunicorn.conf.py server:app)
+    warm_caches()
+    start_background_jobs()
     app.run(host="0.0.0.0", port=5000, debug=True)              #"0.0.0.0" -> server accessible from any device on netwrk 
     # we used 0.0.0.0 as we were facing some error without it. 
 # ye ensures karega that script runs only when executed directly (not when imported as a module)
@@ -0,0 +1,123 @@
+import re
+
+import numpy as np
+import pandas as pd
+
+
+# Spellings used across the volume, collision and speed datasets
+# eg -> "Cross Bronx Expy", "CROSS BRONX EXPRESSWAY" and "Cross Bronx Expwy" are one street
+# Suffixes are only expanded as the last word and directions only as the first or last one,
+# so "ST NICHOLAS AVE" -> "ST NICHOLAS AVENUE" and "DR MARTIN LUTHER KING JR BLVD" keeps its DR
+SUFFIXES = {
+    "AV": "AVENUE",
+    "AVE": "AVENUE",
+    "BLVD": "BOULEVARD",
+    "BR": "BRIDGE",
+    "BRG": "BRIDGE",
+    "CT": "COURT",
+    "DR": "DRIVE",
+    "EXPY": "EXPRESSWAY",
+    "EXPWY": "EXPRESSWAY",
+    "EXWY": "EXPRESSWAY",
+    "HWY": "HIGHWAY",
+    "LN": "LANE",
+    "PKWY": "PARKWAY",
+    "PKY": "PARKWAY",
+    "PL": "PLACE",
+    "RD": "ROAD",
+    "ST": "STREET",
+    "TPKE": "TURNPIKE",
+}
+
+DIRECTIONS = {
+    "E": "EAST",
+    "W": "WEST",
+    "N": "NORTH",
+    "S": "SOUTH",
+}
+
+_NON_ALNUM = re.compile(r"[^A-Z0-9]+")
+_ORDINAL = re.compile(r"^(\d+)(?:ST|ND|RD|TH)$")     # 1ST AVENUE -> 1 AVENUE
+
+
+def normalize_street(name):
+    """Canonical key for a street name, "" for missing names."""
+    if not isinstance(name, str):
+        return ""
+    tokens = _NON_ALNUM.sub(" ", name.upper()).split()
+    tokens = [_ORDINAL.sub(r"\1", token) for token in tokens]
+    if not tokens:
+        return ""
+
+    # "W 42 ST", "BROADWAY E"
+    end = len(tokens)
+    if end > 1 and tokens[-1] in DIRECTIONS:
+        tokens[-1] = DIRECTIONS[tokens[-1]]
+        end -= 1        # the suffix comes before a trailing direction, "5 AVE S"
+    tokens[0] = DIRECTIONS.get(tokens[0], tokens[0])
+    tokens[end - 1] = SUFFIXES.get(tokens[end - 1], tokens[end - 1])
+    return " ".join(tokens)
+
+
+class StreetIndex:
+    """
+    Normalized street key -> row positions, for every registered dataset.
+
+    Built once at load time. Only the distinct spellings of a column are
+    normalized, so the string work is done per name and not per row.
+    """
+
+    def __init__(self):
+        self._keys = {}         # dataset -> Categorical of the normalized key of every row
+        self._rows = {}         # dataset -> {key: np.ndarray of row positions}
+        self._names = {}        # key -> most common spelling, from the first dataset that has the key
+
+    def add(self, dataset, names):
+        codes, spellings = pd.factorize(names)
+        spelling_keys = pd.Index([normalize_street(name) for name in spellings], dtype=object)
+        key_codes, keys = pd.factorize(spelling_keys)
+
+        # row -> key code, -1 for missing or blank names
+        row_codes = np.full(len(codes), -1, dtype=np.int64)
+        has_name = codes >= 0
+        row_codes[has_name] = key_codes[codes[has_name]]
+        blank = keys.get_indexer([""])[0]
+        if blank >= 0:
+            row_codes[row_codes == blank] = -1
+
+        self._keys[dataset] = pd.Categorical.from_codes(row_codes, categories=keys)
+
+        # most common spelling of every key (the first one seen on ties)
+        counts = np.bincount(codes[has_name], minlength=len(spellings))
+        order = np.lexsort((-counts, key_codes))
+        if len(order):
+            first = order[np.r_[True, key_codes[order][1:] != key_codes[order][:-1]]]
+            for spelling in first:
+                key = keys[key_codes[spelling]]
+                if key:
+                    self._names.setdefault(key, str(spellings[spelling]).strip())
+
+        # group row positions by key with one stable sort
+        valid = np.flatnonzero(row_codes >= 0)
+        order = valid[np.argsort(row_codes[valid], kind="stable")]
+        sorted_codes = row_codes[order]
+        starts = np.flatnonzero(np.diff(sorted_codes, prepend=-1))
+        ends = np.append(starts[1:], len(order))
+        self._rows[dataset] = {
+            keys[sorted_codes[start]]: order[start:end] for start, end in zip(starts, ends)
+        }
+
+    def keys(self, dataset):
+        """Normalized key of every row (Categorical, NaN for missing names) - usable as a groupby key."""
+        return self._keys[dataset]
+
+    def name(self, key, default=None):
+        """Display name of a normalized key: its most common spelling in the data."""
+        return self._names.get(key, default)
+
+    def rows(self, dataset, street):
+        """Row positions of `street` in `dataset`, in original order."""
+        return self._rows[dataset].get(normalize_street(street), np.empty(0, dtype=np.intp))
+
+    def frame(self, dataset, df, street):
+        return df.iloc[self.rows(dataset, street)]
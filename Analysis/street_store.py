@@ -0,0 +1,132 @@
+import logging
+import time
+
+import pandas as pd
+
+
+# Per-street aggregates for /street_analysis, built once at startup so a request
+# reads one small record instead of filtering the full volume and collision frames.
+#
+# Records are keyed by the normalized street key (street_index.normalize_street).
+#
+# store[KEY] = {
+#     "volume": {"boro", "hourly_volume" (street, HH, mean Vol), "hourly_volume_total" (HH, summed Vol)},
+#     "accidents": {"total_accidents", "total_injuries", "total_fatalities",
+#                   "hourly_accidents" (Hour, Accident_Count), "vehicle_types" (top 10 counts)},
+#     "merged": hourly volume joined with hourly accidents (for the correlation plot),
+# }
+# "volume" / "accidents" / "merged" are None when that dataset has nothing for the street.
+
+
+def build_volume_records(df, keys):
+    keys = pd.Series(keys, index=df.index, name='key')
+
+    # one groupby over the whole frame instead of one filter per request
+    hourly = df.groupby([keys, df['street'], df['HH']], observed=True)['Vol'].agg(['mean', 'sum'])
+    boros = df.groupby(keys, observed=True)['Boro'].unique()
+
+    records = {}
+    for key, part in hourly.groupby(level='key', sort=False, observed=True):
+        part = part.droplevel('key')
+        records[key] = {
+            "boro": list(boros[key]),
+            # plain strings, so later groupbys on 'street' dont expand every category of the full frame
+            "hourly_volume": part['mean'].rename('Vol').reset_index().astype({'street': object}),
+            "hourly_volume_total": part['sum'].groupby(level='HH').sum().rename('Vol').reset_index(),
+        }
+    return records
+
+
+def build_accident_records(df_acc, keys):
+    keys = pd.Series(keys, index=df_acc.index, name='key')
+
+    totals = df_acc.groupby(keys, observed=True).agg(
+        total_accidents=('Street Name', 'size'),
+        total_injuries=('Persons Injured', 'sum'),
+        total_fatalities=('Persons Killed', 'sum'),
+    )
+    hourly = df_acc.groupby([keys, df_acc['Hour']], observed=True).size()
+    vehicles = df_acc.groupby([keys, df_acc['Vehicle Type']], observed=True).size()
+    top_vehicles = {
+        key: part.droplevel('key').sort_values(ascending=False, kind='stable').head(10)
+        for key, part in vehicles.groupby(level='key', sort=False, observed=True)
+    }
+
+    records = {}
+    for key, part in hourly.groupby(level='key', sort=False, observed=True):
+        records[key] = {
+            "total_accidents": int(totals.at[key, 'total_accidents']),
+            "total_injuries": int(totals.at[key, 'total_injuries']),
+            "total_fatalities": int(totals.at[key, 'total_fatalities']),
+            "hourly_accidents": part.droplevel('key').reset_index(name='Accident_Count'),
+            "vehicle_types": top_vehicles.get(key, pd.Series(dtype='int64')),
+        }
+    return records
+
+
+def merge_hourly(volume, accidents):
+    """
+    Hourly mean volume joined with hourly accident counts.
+
+    Both sides already belong to the same normalized street, so spelling
+    differences ("Fdr Drive" / "FDR DRIVE") no longer drop rows from the join.
+    """
+    hourly_accidents = accidents["hourly_accidents"].rename(columns={'Accident_Count': 'accident_count'})
+    return pd.merge(
+        volume["hourly_volume"],
+        hourly_accidents,
+        left_on='HH',
+        right_on='Hour',
+        how='inner'     # keep only hours that have both volume and accidents
+    )
+
+
+def build_street_store(df, df_acc, street_index):
+    start = time.perf_counter()
+    volume = build_volume_records(df, street_index.keys('volume'))
+    accidents = build_accident_records(df_acc, street_index.keys('collisions'))
+
+    store = {}
+    for key in volume.keys() | accidents.keys():
+        record = {"volume": volume.get(key), "accidents": accidents.get(key), "merged": None}
+        if record["volume"] is not None and record["accidents"] is not None:
+            record["merged"] = merge_hourly(record["volume"], record["accidents"])
+        store[key] = record
+
+    logging.info(f"Street store: {len(store)} streets built in {time.perf_counter() - start:.1f}s")
+    return store
+
+
+if __name__ == '__main__':
+    # Compare the per-request scans /street_analysis used to do with a store lookup
+    from paths import VOLUME_DATA_PATH, ACCIDENT_DATA_PATH
+    from street_index import StreetIndex, normalize_street
+    from preprocess import prepare_volume, prepare_accidents
+
+    df = prepare_volume(pd.read_csv(VOLUME_DATA_PATH))
+    df_acc = prepare_accidents(pd.read_csv(ACCIDENT_DATA_PATH))
+
+    start = time.perf_counter()
+    street_index = StreetIndex()
+    street_index.add('volume', df['street'])
+    street_index.add('collisions', df_acc['Street Name'])
+    store = build_street_store(df, df_acc, street_index)
+    print(f"build: {time.perf_counter() - start:.2f}s for {len(store)} streets")
+
+    streets = df['street'].value_counts().index[:20]
+
+    start = time.perf_counter()
+    for street in streets:
+        street_data = df[df["street"].str.upper() == street.upper()]
+        street_acc = df_acc[df_acc["Street Name"].str.upper() == street.upper()]
+        street_data.groupby(['street', 'HH'])['Vol'].mean()
+        street_acc.groupby('Hour').size()
+        street_acc['Vehicle Type'].value_counts().head(10)
+    scan = (time.perf_counter() - start) / len(streets)
+
+    start = time.perf_counter()
+    for street in streets:
+        store.get(normalize_street(street))
+    lookup = (time.perf_counter() - start) / len(streets)
+
+    print(f"scan: {scan * 1000:.1f} ms/street, store lookup: {lookup * 1e6:.1f} us/street")
@@ -10,6 +10,9 @@ import seaborn as sns
 
 from json_read import json_to_csv
 from peak import peak_hour_func
+from street_index import StreetIndex
+from preprocess import prepare_volume, prepare_accidents
+from schema import VOLUME_SCHEMA, COLLISION_SCHEMA, read_dtypes, apply_schema
 matplotlib.use('Agg')  # Use a non-GUI backend
 
 
@@ -17,16 +20,12 @@ app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
 
 # Volume data
-df = pd.read_csv("Automated_Traffic_Volume_Counts_20250127.csv")
-df['Yr'] = df['Yr'].astype(str)
-df['M'] = df['M'].astype(str)
-df['D'] = df['D'].astype(str)
-
-df['date'] = df[['Yr', 'M', 'D']].agg('-'.join, axis=1)
+df = prepare_volume(pd.read_csv("Automated_Traffic_Volume_Counts_20250127.csv", dtype=read_dtypes(VOLUME_SCHEMA)))
+df = apply_schema(df, VOLUME_SCHEMA, name="volume")
 
 # Accident data
-df_acc = pd.read_csv("C:/Traffic_Data_DM/traffic_project_data/NYC_Collisions/NYC_Collisions.csv")
-df_acc['Hour'] = pd.to_datetime(df_acc['Time'], format='%H:%M:%S').dt.hour  # Hour column
+df_acc = prepare_accidents(pd.read_csv("C:/Traffic_Data_DM/traffic_project_data/NYC_Collisions/NYC_Collisions.csv", dtype=read_dtypes(COLLISION_SCHEMA)))
+df_acc = apply_schema(df_acc, COLLISION_SCHEMA, name="collisions")
 
 # Speeds dataset
 import json
@@ -36,6 +35,12 @@ with open('C:/Traffic_Data_DM/traffic_project_data/speeds.json', 'r') as f:
 # Convert to DataFrame
 speeds = json_to_csv(data)
 
+# normalized street names -> rows for all three datasets, built once
+street_index = StreetIndex()
+street_index.add("volume", df["street"])
+street_index.add("collisions", df_acc["Street Name"])
+street_index.add("speeds", speeds["street_name"])
+
 @app.route("/street_analysis", methods=["GET"])
 def street_analysis():
     street = request.args.get("street")
@@ -43,9 +48,9 @@ def street_analysis():
     if not street:
         return jsonify({"error": "Street name required"}), 400
 
-    street_data = df[df["street"].str.upper() == street.upper()]  # Case insensitive            # Volume data
-    street_acc = df_acc[df_acc["Street Name"].str.upper() == street.upper()]        # Accidents data
-    street_speed = speeds[speeds["street_name"].str.upper() == street.upper()]        # Speeds dataset (Tom Tom august 24)
+    street_data = street_index.frame("volume", df, street)            # Volume data
+    street_acc = street_index.frame("collisions", df_acc, street)        # Accidents data
+    street_speed = street_index.frame("speeds", speeds, street)        # Speeds dataset (Tom Tom august 24)
 
     street_name = street.upper()
     boro = street_data['Boro'].unique()         # take the first boro
@@ -0,0 +1,39 @@
+# pytest Analysis/test_blockage_index.py
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from blockage import parse_blockage
+from blockage_index import BlockageIndex
+
+
+@pytest.fixture(scope="module")
+def index():
+    with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "advisories.html")) as f:
+        return BlockageIndex(parse_blockage(f.read()))
+
+
+def streets(stats):
+    return set(stats["rows"]['From Street']) | set(stats["rows"]['To Street'])
+
+
+@pytest.mark.parametrize("query, street", [
+    ("bqe", "Brooklyn-Queens Expressway"),
+    ("BQE", "Brooklyn-Queens Expressway"),
+    ("lie", "Long Island Expressway"),
+    ("sie", "Staten Island Expressway"),
+    ("fdr", "FDR Drive"),
+])
+def test_initialisms_find_their_street(index, query, street):
+    stats = index.search(query)
+    assert stats is not None
+    assert all(street in {row['From Street'], row['To Street']} for _, row in stats["rows"].iterrows())
+    assert stats["total_blockages"] == index.search(street)["total_blockages"]
+
+
+def test_substring_search_still_matches(index):
+    assert {"Queens Boulevard", "Brooklyn-Queens Expressway", "Ed Koch Queensboro Bridge"} <= streets(index.search("queens"))
+    assert index.search("no such street") is None
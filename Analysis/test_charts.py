@@ -0,0 +1,21 @@
+# pytest Analysis/test_charts.py
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+pytest.importorskip("matplotlib")
+from charts import Prerenderer
+
+
+def test_hit_counts_are_bounded():
+    prerenderer = Prerenderer(lambda street: None, top_n=2, max_streets=10)
+    for _ in range(5):
+        prerenderer.record_hit("BROADWAY")
+    for i in range(100):
+        prerenderer.record_hit(f"STREET {i}")
+
+    assert len(prerenderer.hits) <= 10
+    assert prerenderer.most_requested()[0] == "BROADWAY"
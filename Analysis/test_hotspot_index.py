@@ -0,0 +1,68 @@
+# pytest Analysis/test_hotspot_index.py
+import math
+import os
+import sys
+import time
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from hotspot_index import HotspotIndex, METERS_PER_DEGREE
+
+
+@pytest.fixture
+def index():
+    rng = np.random.default_rng(0)
+    lats = rng.uniform(40.5, 40.9, 5000)
+    lngs = rng.uniform(-74.25, -73.7, 5000)
+    return HotspotIndex([{'lat': float(lat), 'lng': float(lng)} for lat, lng in zip(lats, lngs)])
+
+
+def nearest_by_scan(index, lats, lngs, radius_m):
+    """(route_index, cell id) of every cell within radius_m, measured against every segment."""
+    lats, lngs = np.asarray(lats, dtype=float), np.asarray(lngs, dtype=float)
+    scale_x = METERS_PER_DEGREE * math.cos(math.radians(lats.mean()))
+    px, py = index.lngs * scale_x, index.lats * METERS_PER_DEGREE
+    ax, ay = lngs * scale_x, lats * METERS_PER_DEGREE
+    best = {}
+    for segment in range(len(lats) - 1):
+        dx, dy = ax[segment + 1] - ax[segment], ay[segment + 1] - ay[segment]
+        t = np.clip(((px - ax[segment]) * dx + (py - ay[segment]) * dy) / (dx * dx + dy * dy), 0, 1)
+        dist = np.hypot(px - (ax[segment] + t * dx), py - (ay[segment] + t * dy))
+        for cell in np.flatnonzero(dist <= radius_m):
+            if cell not in best or dist[cell] < best[cell][0]:
+                best[cell] = (dist[cell], segment)
+    return sorted((segment, cell) for cell, (_, segment) in best.items())
+
+
+def found(index, hotspots):
+    ids = {(cell['lat'], cell['lng']): i for i, cell in enumerate(index.cells)}
+    return sorted((hit['route_index'], ids[hit['lat'], hit['lng']]) for hit in hotspots)
+
+
+def test_near_route_matches_a_full_scan(index):
+    lats, lngs = [40.6, 40.8, 40.75], [-74.1, -73.8, -73.95]
+    assert found(index, index.near_route(lats, lngs, 200)) == nearest_by_scan(index, lats, lngs, 200)
+
+
+def test_long_route_only_walks_the_buckets_along_it(index):
+    # one segment across the continent, and one from far outside right through the city
+    start = time.process_time()
+    assert index.near_route([0, 60], [-120, -60], 1000) == []
+    lats, lngs = [40.0, 41.4], [-75.0, -72.7]
+    hotspots = index.near_route(lats, lngs, 1000)
+    assert time.process_time() - start < 1
+    assert hotspots and found(index, hotspots) == nearest_by_scan(index, lats, lngs, 1000)
+
+
+def test_route_over_the_bucket_limit_is_refused(index):
+    with pytest.raises(ValueError):
+        index.near_route([40.5, 40.9] * 1000, [-74.25, -73.7] * 1000, 1000)
+
+
+@pytest.mark.parametrize("lat", [float('nan'), float('inf'), 91.0])
+def test_invalid_coordinates_are_refused(index, lat):
+    with pytest.raises(ValueError):
+        index.near_route([lat, 40.7], [-74.0, -74.0], 100)
@@ -0,0 +1,38 @@
+# pytest Analysis/test_hotspot_tiles.py
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from hotspot_tiles import HotspotTiles, write_tiles
+
+
+@pytest.fixture
+def tiles(tmp_path):
+    # 0.001 degree grid keys, as accidentAnalysis.grid_keys writes them
+    grid = {
+        (40712, -74006): {'count': 3, 'injuries': 1, 'deaths': 0, 'factors': {'Unspecified': 3}},
+        (40758, -73985): {'count': 5, 'injuries': 2, 'deaths': 1, 'factors': {'Speeding': 5}},
+    }
+    write_tiles(grid, str(tmp_path / "tiles"))
+    return HotspotTiles(str(tmp_path / "tiles"))
+
+
+def test_query_returns_the_cells_in_the_box(tiles):
+    precision, cells = tiles.query(40.70, -74.02, 40.78, -73.93, 14)
+    assert precision == 3
+    assert [(cell['lat'], cell['lng']) for cell in cells] == [(40.758, -73.985), (40.712, -74.006)]
+
+
+@pytest.mark.parametrize("bbox", [
+    (40.70, -74.02, float('inf'), -73.93),
+    (40.70, float('-inf'), 40.78, -73.93),
+    (float('nan'), -74.02, 40.78, -73.93),
+    (40.70, -74.02, 91.0, -73.93),
+    (40.78, -74.02, 40.70, -73.93),
+])
+def test_invalid_bbox_is_refused(tiles, bbox):
+    with pytest.raises(ValueError):
+        tiles.query(*bbox, 14)
@@ -0,0 +1,26 @@
+# pytest Analysis/test_preprocess.py
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from preprocess import prepare_accidents
+
+
+def test_missing_time_has_no_hour():
+    df_acc = prepare_accidents(pd.DataFrame({
+        'Time': ['08:15:00', None, '23:40:00', '08:50:00', np.nan],
+        'Date': ['2024-01-01'] * 5,
+    }))
+
+    assert df_acc['Hour'].isna().tolist() == [False, True, False, False, True]
+    # rows without a time are not counted in any hour, hour 23 only has its own accident
+    assert df_acc.groupby('Hour').size().to_dict() == {8: 2, 23: 1}
+
+
+def test_all_times_missing():
+    df_acc = prepare_accidents(pd.DataFrame({'Time': [None, None], 'Date': ['2024-01-01'] * 2}))
+    assert df_acc['Hour'].isna().all()
@@ -0,0 +1,37 @@
+# pytest Analysis/test_street_index.py
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from street_index import StreetIndex, normalize_street
+
+
+@pytest.mark.parametrize("name, key", [
+    ("ST NICHOLAS AVE", "ST NICHOLAS AVENUE"),
+    ("West 42nd Street", "WEST 42 STREET"),
+    ("W 42 ST", "WEST 42 STREET"),
+    ("5 AVE S", "5 AVENUE SOUTH"),
+    ("DR MARTIN LUTHER KING JR BLVD", "DR MARTIN LUTHER KING JR BOULEVARD"),
+    ("Cross Bronx Expy", "CROSS BRONX EXPRESSWAY"),
+    (None, ""),
+])
+def test_normalize_street(name, key):
+    assert normalize_street(name) == key
+
+
+def test_spellings_share_one_key_and_display_name():
+    index = StreetIndex()
+    index.add('volume', pd.Series(['Fdr Drive', 'FDR DRIVE', 'FDR DRIVE', None, 'Broadway']))
+    index.add('collisions', pd.Series(['FDR DR', 'broadway ', 'Cross Bronx Expy']))
+
+    assert index.rows('collisions', 'fdr drive').tolist() == [0]
+    assert index.rows('volume', 'Fdr Dr').tolist() == [0, 1, 2]
+    # most common spelling, from the first dataset that has the street
+    assert index.name('FDR DRIVE') == 'FDR DRIVE'
+    assert index.name(normalize_street('BROADWAY ')) == 'Broadway'
+    assert index.name('CROSS BRONX EXPRESSWAY') == 'Cross Bronx Expy'
+    assert index.name('NO SUCH STREET', 'fallback') == 'fallback'
@@ -0,0 +1,60 @@
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+
+# Open-Meteo answers from a ~10 km grid and accepts multi-day start_date / end_date ranges,
+# so the weather enrichment asks once per (grid cell, run of consecutive days) instead of
+# once per sensor and day. Used by Volume Analysis/weatherFetch.py and a.py.
+
+GRID_STEP = 0.1         # degrees, ~10 km
+MAX_RANGE_DAYS = 366    # keeps each response small
+
+
+def snap(values, step=GRID_STEP):
+    """Coordinates -> centre of their weather grid cell (vectorized)."""
+    snapped = np.round(np.asarray(values, dtype=float) / step) * step
+    return np.round(snapped, 6)     # 40.7000000001 -> 40.7, so equal cells compare equal
+
+
+def contiguous_ranges(days, max_days=MAX_RANGE_DAYS):
+    """Sorted distinct days -> [(start, end)] ISO strings, one per run of consecutive days."""
+    days = sorted(set(pd.to_datetime(list(days)).date))
+    ranges = []
+    for day in days:
+        if ranges and day - ranges[-1][1] == timedelta(days=1) and (day - ranges[-1][0]).days < max_days:
+            ranges[-1][1] = day
+        else:
+            ranges.append([day, day])
+    return [(start.isoformat(), end.isoformat()) for start, end in ranges]
+
+
+def plan_requests(lats, lons, days, step=GRID_STEP, max_days=MAX_RANGE_DAYS):
+    """
+    One (cell lat, cell lon, start, end) request per grid cell and run of days.
+
+    lats / lons / days are per row; days as anything pd.to_datetime understands.
+    """
+    cells = pd.DataFrame({
+        'lat': snap(lats, step),
+        'lon': snap(lons, step),
+        'day': pd.to_datetime(pd.Series(days)).dt.date,
+    }).drop_duplicates()
+    return [
+        (lat, lon, start, end)
+        for (lat, lon), group in cells.groupby(['lat', 'lon'], sort=False)
+        for start, end in contiguous_ranges(group['day'], max_days)
+    ]
+
+
+def iter_days(data):
+    """Open-Meteo response -> (ISO day, {variable: value}) for every day it covers."""
+    daily = data.get('daily', {})
+    for i, day in enumerate(daily.get('time', [])):
+        yield day, {name: values[i] for name, values in daily.items() if name != 'time'}
+
+
+def days_between(start, end):
+    start, end = date.fromisoformat(start), date.fromisoformat(end)
+    return [(start + timedelta(days=i)).isoformat() for i in range((end - start).days + 1)]
@@ -0,0 +1,237 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+import requests
+
+from refresh_lock import RefreshLock
+from weather_grid import snap
+
+
+# Weather on disk, shared by the enrichment job (Volume Analysis/weatherFetch.py writes the
+# daily history it fetches) and the server (reads the current conditions the refresher keeps
+# up to date). One SQLite file, keyed by grid cell (see weather_grid.snap), day and hour.
+# WAL mode lets the server read while a job is writing.
+
+# model inputs, same names as the volume dataset columns
+COLUMNS = ['temp_max', 'temp_min', 'precipitation', 'rain', 'snow', 'windspeed_max']
+
+DAILY = -1      # hour of rows that hold a whole day (the archive API answers per day)
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache", "weather.sqlite")
+
+# used until the first current conditions were fetched
+DEFAULT_WEATHER = {
+    "temp_max": 25,
+    "temp_min": 15,
+    "precipitation": 0.1,
+    "rain": 0,
+    "snow": 0,
+    "windspeed_max": 15
+}
+
+FORECAST_URL = "https://api.open-meteo.com/v1/forecast"
+NYC = (40.7128, -74.0060)
+
+
+class WeatherStore:
+    """Weather rows in a SQLite file: (lat, lon, day, hour) -> COLUMNS, with the time they were fetched."""
+
+    def __init__(self, path=None):
+        self.path = path or os.environ.get("WEATHER_DB", DEFAULT_PATH)
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with self._connect() as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS weather ("
+                " lat REAL NOT NULL, lon REAL NOT NULL, day TEXT NOT NULL, hour INTEGER NOT NULL,"
+                + "".join(f" {column} REAL," for column in COLUMNS)
+                + " fetched_at REAL NOT NULL,"
+                " PRIMARY KEY (lat, lon, day, hour))"
+            )
+
+    def _connect(self):
+        # one short lived connection per call, so any thread / forked worker can use the store
+        return sqlite3.connect(self.path, timeout=30)
+
+    def put_many(self, rows, fetched_at=None):
+        """rows: iterable of (lat, lon, day, hour, {column: value}); replaces existing rows."""
+        fetched_at = fetched_at or time.time()
+        values = [
+            (lat, lon, day, hour, *(weather.get(column) for column in COLUMNS), fetched_at)
+            for lat, lon, day, hour, weather in rows
+        ]
+        with self._connect() as db:
+            db.executemany(
+                f"INSERT OR REPLACE INTO weather VALUES ({', '.join('?' * (len(COLUMNS) + 5))})", values
+            )
+        return len(values)
+
+    def get_range(self, lat, lon, start, end, hour=DAILY):
+        """{ISO day: {column: value}} of one cell for the days from start to end that are stored."""
+        return {day: values for (_, _, day), values in self.get_ranges([(lat, lon, start, end)], hour).items()}
+
+    def get_ranges(self, ranges, hour=DAILY):
+        """{(lat, lon, ISO day): {column: value}} stored for every (lat, lon, start, end), over one connection."""
+        found = {}
+        with self._connect() as db:
+            for lat, lon, start, end in ranges:
+                rows = db.execute(
+                    f"SELECT day, {', '.join(COLUMNS)} FROM weather"
+                    " WHERE lat = ? AND lon = ? AND hour = ? AND day BETWEEN ? AND ?",
+                    (lat, lon, hour, start, end)
+                )
+                for row in rows:
+                    found[(lat, lon, row[0])] = dict(zip(COLUMNS, row[1:]))
+        return found
+
+    def latest(self, lat, lon):
+        """(values, fetched_at) of the newest hourly row of a cell, None if there is none."""
+        with self._connect() as db:
+            row = db.execute(
+                f"SELECT fetched_at, {', '.join(COLUMNS)} FROM weather"
+                " WHERE lat = ? AND lon = ? AND hour != ? ORDER BY day DESC, hour DESC LIMIT 1",
+                (lat, lon, DAILY)
+            ).fetchone()
+        if row is None:
+            return None
+        return dict(zip(COLUMNS, row[1:])), row[0]
+
+
+def fetch_current(lat, lon, timeout=10):
+    """Current conditions from the Open-Meteo forecast API as our weather columns."""
+    params = {
+        "latitude": lat,
+        "longitude": lon,
+        "current_weather": True,
+        "timezone": "America/New_York"
+    }
+    response = requests.get(FORECAST_URL, params=params, timeout=timeout)
+    response.raise_for_status()
+    current_weather = response.json().get("current_weather", {})
+    return {
+        "temp_max": current_weather.get("temperature", 25),
+        "temp_min": current_weather.get("temperature", 15),
+        "precipitation": current_weather.get("precipitation", 0.1),
+        "rain": 1 if current_weather.get("precipitation", 0) > 0 else 0,
+        "snow": 0,
+        "windspeed_max": current_weather.get("windspeed", 15),
+    }
+
+
+class CurrentWeather:
+    """
+    Current conditions of the grid cell containing (lat, lon), refreshed every `ttl` seconds
+    by a background thread and written to the store (so restarted / other processes start
+    from the last value). on_update(values) is called whenever new values are taken in.
+
+    get() never waits for the network: it returns the last known values, falling back to
+    the store and then to DEFAULT_WEATHER, and only schedules a refresh when they are old.
+
+    Of the processes sharing the store (gunicorn workers, the prediction backend) only the
+    holder of its RefreshLock calls the API; the others read the stored values every
+    poll_interval seconds.
+    """
+
+    def __init__(self, store, lat=NYC[0], lon=NYC[1], ttl=900, retry_after=60, fetch=fetch_current, on_update=None,
+                 poll_interval=60):
+        self.store = store
+        # keyed by weather grid cell, like the rows of the enrichment job
+        self.lat = float(snap(lat))
+        self.lon = float(snap(lon))
+        self.ttl = ttl
+        self.retry_after = retry_after      # seconds between attempts after a failed refresh
+        self.fetch = fetch
+        self.on_update = on_update
+        self.poll_interval = poll_interval
+        self.refresh_lock = RefreshLock(f"{store.path}.refresh.lock")
+
+        self.values = None
+        self.fetched_at = 0.0
+        self._attempted_at = 0.0
+
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()   # one refresh at a time
+        self._thread = None
+
+    def load(self):
+        """Last stored conditions, returns False if there are none."""
+        try:
+            latest = self.store.latest(self.lat, self.lon)
+        except sqlite3.Error as e:
+            logging.error(f"Reading stored weather failed: {e}")
+            return False
+        if latest is None:
+            return False
+        self._set_values(*latest)
+        return True
+
+    def _set_values(self, values, fetched_at):
+        with self._lock:
+            changed = values != self.values
+            self.values, self.fetched_at = values, fetched_at
+        if changed and self.on_update is not None:
+            try:
+                self.on_update(dict(values))
+            except Exception as e:
+                logging.error(f"Weather update callback failed: {e}")
+
+    def refresh(self):
+        with self._refresh_lock:
+            self._attempted_at = time.time()
+            values = self.fetch(self.lat, self.lon)
+            now = datetime.now()
+            self.store.put_many([(self.lat, self.lon, now.date().isoformat(), now.hour, values)])
+            self._set_values(values, time.time())
+
+    def refresh_safely(self):
+        try:
+            self.refresh()
+        except Exception as e:      # keep serving the old values
+            logging.error(f"Weather refresh failed: {e}")
+
+    def is_stale(self):
+        return time.time() - self.fetched_at > self.ttl
+
+    def _can_retry(self):
+        return time.time() - self._attempted_at > self.retry_after
+
+    def refresh_in_background(self):
+        if self._refresh_lock.locked() or not self._can_retry():     # already running / failed just now
+            return
+        threading.Thread(target=self.refresh_safely, name="weather-refresh", daemon=True).start()
+
+    def get(self):
+        """Latest conditions as {column: value}, without blocking on the API."""
+        if self.values is None:
+            self.load()
+        if self.is_stale() and self.refresh_lock.acquire():
+            self.refresh_in_background()
+        values = self.values
+        return dict(DEFAULT_WEATHER if values is None else values)
+
+    def _run(self):
+        while True:
+            if self.refresh_lock.acquire():
+                if self.is_stale():
+                    self.refresh_safely()
+                # sleep until the values expire, retry failed refreshes sooner
+                wait = self.fetched_at + self.ttl - time.time()
+                wait = wait if wait > 0 else self.retry_after
+            else:
+                self.load()         # another process refreshes, pick up what it stored
+                wait = self.poll_interval
+            time.sleep(wait)
+
+    def start(self):
+        """Starts the scheduled refresher once."""
+        if self.values is None:
+            self.load()
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name="weather-scheduler", daemon=True)
+        self._thread.start()
@@ -1,9 +1,18 @@
-from flask import Flask, jsonify, request
+from flask import Flask, Response, jsonify, request
+import json
+import os
+import sys
 import joblib
 import pandas as pd
+import numpy as np
 from flask_cors import CORS
 from datetime import datetime, timedelta, timezone
 
+from prediction_table import PredictionTable, ResponseCache
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Analysis"))
+from weather_store import WeatherStore, CurrentWeather
+
 app = Flask(__name__)
 CORS(app)
 
@@ -23,27 +32,64 @@ vdf = pd.read_csv(r"model\volume_dataset.csv")
 #     predicted_volume = model.predict(input_data)[0]
 #     return predicted_volume
 
-def predict_traffic(lat, lon, hour, minute):
+# Features the saved model was trained on (see test.py)
+FEATURES = ['HH', 'MM', 'temp_max', 'temp_min', 'precipitation', 'rain', 'snow', 'windspeed_max']
+
+# used until the weather store (see weather_source below) has current conditions
+DEFAULT_WEATHER = {
+    'temp_max': 25,
+    'temp_min': 15,
+    'precipitation': 0.1,
+    'rain': 0,
+    'snow': 0,
+    'windspeed_max': 15
+}
+current_weather = dict(DEFAULT_WEATHER)
+
+
+def build_features(lats, lons, times):
+    """
+    Build one feature matrix for every (time, point) pair.
+
+    Rows are time-major: all points for times[0], then all points for times[1] ...
+    """
+    n_points = len(lats)
+    features = pd.DataFrame({
+        'Latitude': np.tile(np.asarray(lats, dtype=float), len(times)),
+        'Longitude': np.tile(np.asarray(lons, dtype=float), len(times)),
+        'HH': np.repeat([t.hour for t in times], n_points),
+        'MM': np.repeat([t.minute for t in times], n_points),
+    })
+    for col, value in current_weather.items():
+        features[col] = value
+    return features
+
+
+def predict_traffic_batch(lats, lons, times):
+    """
+    Predict traffic volume for every point at every time with a single model.predict call.
+
+    Returns an array of shape (len(times), len(lats)).
+    """
+    shape = (len(times), len(lats))
+    if 0 in shape:
+        return np.zeros(shape)
     try:
-        # Here you could add API call to get real weather data
-        # For now using more realistic dummy values
-        input_data = pd.DataFrame([{
-            'HH': hour,
-            'MM': minute,
-            'temp_max': 25,  # More realistic default values
-            'temp_min': 15,  # that could be updated with real
-            'precipitation': 0.1,  # weather API data
-            'rain': 0,
-            'snow': 0,
-            'windspeed_max': 15
-        }])
-        
-        predicted_volume = model.predict(input_data)[0]
-        return predicted_volume
-        
+        X = build_features(lats, lons, times)[FEATURES]
+
+        # identical feature rows (same slot, same weather) only need to be predicted once
+        unique_X, inverse = np.unique(X.to_numpy(dtype=float), axis=0, return_inverse=True)
+        predicted = model.predict(pd.DataFrame(unique_X, columns=FEATURES))
+        return predicted[inverse.reshape(-1)].reshape(shape)
+
     except Exception as e:
         print(f"Error predicting traffic: {e}")
-        return 0 
+        return np.zeros(shape)
+
+
+def predict_traffic(lat, lon, hour, minute):
+    volume = predict_traffic_batch([lat], [lon], [datetime.now().replace(hour=hour, minute=minute)])
+    return volume[0, 0]
     
 
 # Define traffic colors based on volume
@@ -55,27 +101,69 @@ def get_traffic_color(volume):
     else:
         return "green"
 
+
+def get_traffic_colors(volumes):
+    """Vectorized get_traffic_color for an array of volumes."""
+    volumes = np.asarray(volumes)
+    return np.select([volumes > 100, volumes > 50], ["red", "yellow"], default="green")
+
+
+# Location index - vdf has one row per time stamp, so the unique street segments
+# are built once here and /predict_all answers one prediction per segment
+locations = vdf[['street', 'Latitude', 'Longitude']].drop_duplicates().reset_index(drop=True)
+prediction_table = PredictionTable(predict_traffic_batch, locations['Latitude'], locations['Longitude'])
+
+# encoded /predict_all body for the current slot, shared by every client
+predict_all_cache = ResponseCache()
+
+
+def update_weather(weather):
+    """Use new weather values for predictions and rebuild the precomputed table."""
+    current_weather.update(weather)
+    prediction_table.invalidate()
+
+
+# current conditions from the shared weather store, set up by start_weather()
+weather_source = None
+
+
+def start_weather(store=None):
+    """
+    Follows the current conditions in the weather store shared with the analysis server
+    (Analysis/weather_store.py); every new value goes through update_weather().
+    """
+    global weather_source
+    if weather_source is None:
+        weather_source = CurrentWeather(store or WeatherStore(), ttl=int(os.environ.get("WEATHER_TTL_SECONDS", 900)),
+                                        on_update=update_weather)
+    weather_source.start()
+    return weather_source
+
+
 # ✅ Route 1: Predict Traffic for All Streets (Without Weather)
 @app.route('/predict_all', methods=['GET'])
 def predict_all():
-    predictions = []
+    prediction_table.start()
+    version = prediction_table.version
+    slot, volumes = prediction_table.get()
 
-    for _, row in vdf.iterrows():
-        lat, lon = row["Latitude"], row["Longitude"]
-        current_hour = datetime.now().hour
-        current_minute = datetime.now().minute
+    def render():
+        predictions = pd.DataFrame({
+            "street": locations["street"],
+            "latitude": locations["Latitude"],
+            "longitude": locations["Longitude"],
+            "traffic_color": get_traffic_colors(volumes)
+        }).to_dict(orient='records')
+        return json.dumps(predictions, separators=(',', ':')).encode('utf-8')
 
-        volume = predict_traffic(lat, lon, current_hour, current_minute)
-        traffic_color = get_traffic_color(volume)
+    gzip_ok = 'gzip' in request.headers.get('Accept-Encoding', '')
+    body = predict_all_cache.get((slot, version), render, gzip_ok)
 
-        predictions.append({
-            "street": row["street"],
-            "latitude": lat,
-            "longitude": lon,
-            "traffic_color": traffic_color
-        })
-
-    return jsonify(predictions)
+    response = Response(body, mimetype='application/json')
+    response.headers['Vary'] = 'Accept-Encoding'
+    if gzip_ok:
+        response.headers['Content-Encoding'] = 'gzip'
+    return response
 
 # ✅ Route 2: Predict Traffic for User's Selected Route (Without Weather)
 @app.route('/predict_route', methods=['POST'])
@@ -83,21 +171,20 @@ def predict_route():
     data = request.json
     route_points = data.get("route_points", [])
 
-    predictions = []
-
-    for point in route_points:
-        lat, lon = point["latitude"], point["longitude"]
-        current_hour = datetime.now().hour
-        current_minute = datetime.now().minute
+    lats = [point["latitude"] for point in route_points]
+    lons = [point["longitude"] for point in route_points]
 
-        volume = predict_traffic(lat, lon, current_hour, current_minute)
-        traffic_color = get_traffic_color(volume)
+    volumes = predict_traffic_batch(lats, lons, [datetime.now()])[0]
+    traffic_colors = get_traffic_colors(volumes)
 
-        predictions.append({
+    predictions = [
+        {
             "latitude": lat,
             "longitude": lon,
-            "traffic_color": traffic_color
-        })
+            "traffic_color": str(traffic_color)
+        }
+        for lat, lon, traffic_color in zip(lats, lons, traffic_colors)
+    ]
 
     return jsonify(predictions)
 
@@ -109,42 +196,33 @@ def predict_future():
     
     # Get current time
     current_time = datetime.now()
-    future_time = current_time + timedelta(minutes=30)
-    
-    predictions = []
-    
-    for point in route_points:
-        lat, lon = point["latitude"], point["longitude"]
-        
-        # Current traffic prediction
-        current_volume = predict_traffic(
-            lat, 
-            lon, 
-            current_time.hour,
-            current_time.minute
-        )
-        
-        # Future traffic prediction (properly handling hour rollover)
-        future_volume = predict_traffic(
-            lat,
-            lon,
-            future_time.hour,
-            future_time.minute
+    future_time = current_time + timedelta(minutes=30)   # timedelta handles the hour rollover
+
+    lats = [point["latitude"] for point in route_points]
+    lons = [point["longitude"] for point in route_points]
+
+    # current and future traffic for every point in one predict call
+    current_volumes, future_volumes = predict_traffic_batch(lats, lons, [current_time, future_time])
+
+    # Calculate percentage change
+    with np.errstate(divide='ignore', invalid='ignore'):
+        change_percents = np.where(
+            current_volumes > 0,
+            (future_volumes - current_volumes) / current_volumes * 100,
+            0
         )
-        
-        # Calculate percentage change
-        if current_volume > 0:
-            change_percent = ((future_volume - current_volume) / current_volume) * 100
-        else:
-            change_percent = 0
-            
-        predictions.append({
+
+    predictions = [
+        {
             "latitude": lat,
             "longitude": lon,
-            "current_volume": round(current_volume, 2),
-            "future_volume": round(future_volume, 2),
-            "change_percent": round(change_percent, 2)
-        })
+            "current_volume": round(float(current_volume), 2),
+            "future_volume": round(float(future_volume), 2),
+            "change_percent": round(float(change_percent), 2)
+        }
+        for lat, lon, current_volume, future_volume, change_percent
+        in zip(lats, lons, current_volumes, future_volumes, change_percents)
+    ]
     
     return jsonify(predictions)
 # def predict_future():
@@ -176,4 +254,6 @@ def predict_future():
 #     return jsonify(predictions)
 
 if __name__ == '__main__':
+    start_weather()
+    prediction_table.start()
     app.run(host="0.0.0.0", port=5000)
@@ -0,0 +1,114 @@
+import gzip
+import threading
+from datetime import datetime, timedelta
+
+import numpy as np
+
+
+class PredictionTable:
+    """
+    Per-minute traffic predictions for a fixed set of locations.
+
+    A background thread predicts every location for the current minute and the
+    next `horizon` minutes in one vectorized pass, so a request only has to look
+    its slot up. The table is rebuilt when the window is half used or when the
+    model inputs change (see invalidate()).
+    """
+
+    def __init__(self, predict_fn, lats, lons, horizon=60):
+        self.predict_fn = predict_fn        # predict_fn(lats, lons, times) -> array (len(times), len(lats))
+        self.lats = np.asarray(lats, dtype=float)
+        self.lons = np.asarray(lons, dtype=float)
+        self.horizon = horizon
+        self.slots = {}         # slot (datetime rounded to the minute) -> float32 volume per location
+        self.version = 0        # bumped on every rebuild
+        self._stale = False
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    @staticmethod
+    def slot_for(when):
+        return when.replace(second=0, microsecond=0)
+
+    def refresh(self, now=None):
+        start = self.slot_for(now or datetime.now())
+        times = [start + timedelta(minutes=i) for i in range(self.horizon)]
+        volumes = np.asarray(self.predict_fn(self.lats, self.lons, times), dtype=np.float32)
+
+        slots = dict(zip(times, volumes))
+        with self._lock:
+            self.slots = slots      # swap the whole table so readers never see a half built one
+            self.version += 1
+
+    def get(self, now=None):
+        """Returns (slot, volumes) for the slot containing `now`, building it if missing."""
+        now = now or datetime.now()
+        slot = self.slot_for(now)
+        volumes = self.slots.get(slot)
+        # without the background thread nobody else rebuilds an invalidated table
+        if volumes is None or (self._stale and self._thread is None):
+            self._stale = False
+            self.refresh(now)
+            volumes = self.slots[slot]
+        return slot, volumes
+
+    def invalidate(self):
+        """Mark the table stale (e.g. new weather was fetched) and wake the refresher."""
+        self._stale = True
+        self._wake.set()
+
+    def _needs_refresh(self, slot):
+        if self._stale or slot not in self.slots:
+            return True
+        remaining = max(self.slots) - slot
+        return remaining < timedelta(minutes=self.horizon // 2)
+
+    def _run(self):
+        while True:
+            now = datetime.now()
+            if self._needs_refresh(self.slot_for(now)):
+                self._stale = False
+                try:
+                    self.refresh(now)
+                except Exception as e:
+                    print(f"Error refreshing prediction table: {e}")
+
+            # sleep until the next minute boundary, or until invalidated
+            self._wake.wait(60 - now.second - now.microsecond / 1e6)
+            self._wake.clear()
+
+    def start(self):
+        """Start the background refresher once (safe to call on every request)."""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name="prediction-table", daemon=True)
+        self._thread.start()
+
+
+class ResponseCache:
+    """
+    Keeps the already encoded response body for one key (e.g. the current slot),
+    plus a gzipped copy made on first demand.
+    """
+
+    def __init__(self, compresslevel=6):
+        self.compresslevel = compresslevel
+        self.key = None
+        self.body = None
+        self.gzipped = None
+        self._lock = threading.Lock()
+
+    def get(self, key, render, gzip_ok=False):
+        """render() -> bytes is only called when `key` changes."""
+        with self._lock:    # concurrent requests for a new key wait for one render
+            if self.key != key:
+                self.body = render()
+                self.gzipped = None
+                self.key = key
+            if not gzip_ok:
+                return self.body
+            if self.gzipped is None:
+                self.gzipped = gzip.compress(self.body, self.compresslevel)
+            return self.gzipped
@@ -0,0 +1,77 @@
+# pytest model/test_backend.py
+# backend.py loads the trained model and the volume dataset at import, both are replaced
+# here by a small model whose prediction depends on the weather.
+import importlib
+import os
+import sys
+import time
+from datetime import datetime
+
+import joblib
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+
+class WeatherModel:
+    """Volume = 10 * temp_max + HH, so any temperature change shows in the predictions."""
+
+    def predict(self, X):
+        return (X['temp_max'] * 10 + X['HH']).to_numpy(dtype=float)
+
+
+@pytest.fixture
+def backend(monkeypatch, tmp_path):
+    monkeypatch.setenv("WEATHER_DB", str(tmp_path / "weather.sqlite"))
+    monkeypatch.setattr(joblib, "load", lambda path: WeatherModel())
+    monkeypatch.setattr(pd, "read_csv", lambda path, *args, **kwargs: pd.DataFrame({
+        'street': ['A', 'B'], 'Latitude': [40.71, 40.75], 'Longitude': [-74.00, -73.98],
+    }))
+    sys.modules.pop("backend", None)
+    module = importlib.import_module("backend")
+    monkeypatch.undo()      # the fake model / dataset are only needed for the import
+    monkeypatch.setenv("WEATHER_DB", str(tmp_path / "weather.sqlite"))
+    return module
+
+
+def test_update_weather_changes_later_predictions(backend):
+    now = datetime(2025, 4, 26, 8, 0)
+    _, before = backend.prediction_table.get(now)
+    route_before = backend.predict_traffic_batch([40.71], [-74.00], [now])
+
+    backend.update_weather({'temp_max': backend.DEFAULT_WEATHER['temp_max'] + 5})
+
+    _, after = backend.prediction_table.get(now)
+    route_after = backend.predict_traffic_batch([40.71], [-74.00], [now])
+    np.testing.assert_allclose(after - before, 50)
+    np.testing.assert_allclose(route_after - route_before, 50)
+
+
+def test_weather_source_refresh_reaches_predictions(backend):
+    from weather_store import CurrentWeather, WeatherStore
+
+    now = datetime(2025, 4, 26, 8, 0)
+    _, before = backend.prediction_table.get(now)
+    # what the analysis server's refresher writes, the backend's source reads it from the store
+    CurrentWeather(WeatherStore(), fetch=lambda lat, lon: dict(backend.DEFAULT_WEATHER, temp_max=3.0)).refresh()
+
+    backend.start_weather()
+    _, after = backend.prediction_table.get(now)
+    assert backend.current_weather['temp_max'] == 3.0
+    np.testing.assert_allclose(after - before, (3.0 - backend.DEFAULT_WEATHER['temp_max']) * 10)
+
+
+def test_running_table_rebuilds_after_weather_update(backend):
+    backend.prediction_table.start()
+    _, before = backend.prediction_table.get()
+    version = backend.prediction_table.version
+
+    backend.update_weather({'temp_max': 40})
+
+    deadline = time.time() + 5
+    while backend.prediction_table.version == version and time.time() < deadline:
+        time.sleep(0.01)
+    _, after = backend.prediction_table.get()
+    np.testing.assert_allclose(after - before, (40 - backend.DEFAULT_WEATHER['temp_max']) * 10)